@@ -0,0 +1,71 @@
+# streamlit run src/admin.py --server.port 8502
+"""
+Admin page: Gemini token usage and estimated cost, per hour and per event.
+Set ADMIN_PASSWORD to require a password.
+"""
+import io
+import os
+
+import pandas as pd
+import streamlit as st
+from dotenv import load_dotenv
+
+from usage_store import DEFAULT_EVENT, DEFAULT_USAGE_PATH, UsageStore
+
+load_dotenv()
+
+st.set_page_config(page_title="Chatbot Admin - Usage", page_icon="📊", layout="wide")
+
+
+def get_secret(key, default=None):
+    """Get secret from Streamlit secrets or environment variable"""
+    try:
+        return st.secrets[key]
+    except:
+        return os.getenv(key, default)
+
+
+@st.cache_resource(show_spinner=False)
+def get_usage_store():
+    return UsageStore(get_secret("USAGE_STORE_PATH", DEFAULT_USAGE_PATH), get_secret("EVENT_NAME", DEFAULT_EVENT))
+
+
+def main():
+    password = get_secret("ADMIN_PASSWORD")
+    if password and st.text_input("Password", type="password") != password:
+        st.stop()
+
+    store = get_usage_store()
+    st.title("📊 Gemini usage")
+    st.caption("Costs are estimates from the price table in usage_store.py, not the Google invoice.")
+
+    events = pd.DataFrame(store.event_totals())
+    if events.empty:
+        st.info("No LLM calls recorded yet.")
+        return
+
+    event = st.selectbox("Event", sorted(events["bucket"].unique()), index=0)
+    selected = events[events["bucket"] == event]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Calls", int(selected["calls"].sum()))
+    col2.metric("Input tokens", f"{int(selected['input_tokens'].sum()):,}")
+    col3.metric("Cached tokens", f"{int(selected['cached_tokens'].sum()):,}")
+    col4.metric("Est. cost (USD)", f"${selected['cost_usd'].fillna(0).sum():.4f}")
+
+    st.subheader("Per hour")
+    hourly = pd.DataFrame(store.hourly_totals(event))
+    if not hourly.empty:
+        st.bar_chart(hourly.pivot_table(index="bucket", columns="model", values="cost_usd", aggfunc="sum").fillna(0))
+        st.dataframe(hourly.rename(columns={"bucket": "hour"}), use_container_width=True)
+
+    st.subheader("Per event")
+    st.dataframe(events.rename(columns={"bucket": "event"}), use_container_width=True)
+
+    buffer = io.StringIO()
+    count = store.export_csv(buffer, event)
+    st.download_button(f"⬇️ Export {count} calls as CSV", buffer.getvalue().encode("utf-8-sig"),
+                       file_name=f"llm_usage_{event}.csv", mime="text/csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# python src/api.py
+# or: API_WORKERS=2 uvicorn api:app --app-dir src --host 0.0.0.0 --port 8000 --workers 2
+"""
+HTTP fortune service: participant lookup and fortune generation behind
+the Streamlit front ends (set FORTUNE_API_URL in the apps to use it).
+
+Each uvicorn worker process builds its own FortuneService (workbook snapshot,
+Gemini model, caches); the stores are SQLite in WAL mode so workers share them.
+
+The Gemini queue (scheduler.py) and request coalescing are per worker, so the
+default is one worker: generation is I/O-bound and threads are enough, and
+every kiosk then sees one queue with true positions. With more workers, set
+API_WORKERS (or uvicorn's WEB_CONCURRENCY) to the worker count: each worker
+takes its share of QUEUE_MAX_CONCURRENCY and LLM_RATE_PER_MINUTE, but queue
+positions and ETAs only cover the worker that got the request.
+"""
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from fortune_service import FortuneService
+from metrics import METRICS
+
+load_dotenv()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # from_settings bắt đầu warm-up ở thread nền, xem /ready
+    app.state.service = FortuneService.from_settings(os.getenv, usage_source="api", workers=api_workers())
+    yield
+
+
+def api_workers():
+    """Number of uvicorn worker processes sharing the Gemini quota"""
+    return max(1, int(os.getenv("API_WORKERS") or os.getenv("WEB_CONCURRENCY") or 1))
+
+
+app = FastAPI(title="Year-End Party Fortune Service", lifespan=lifespan)
+
+
+class FortuneRequest(BaseModel):
+    query: str
+    fortune_number: Optional[str] = None
+
+
+@app.get("/participants/{query}")
+async def get_participant(query: str):
+    """Guest by employee ID or name; fuzzy candidates when the name is ambiguous"""
+    result = await run_in_threadpool(app.state.service.participant, query)
+    if result["participant"] is None and not result["candidates"]:
+        raise HTTPException(status_code=404, detail="Participant not found")
+    return result
+
+
+@app.post("/fortune")
+async def fortune(request: FortuneRequest):
+    """Whole fortune in one JSON response"""
+    return await run_in_threadpool(app.state.service.fortune, request.query, request.fortune_number)
+
+
+@app.post("/fortune/stream")
+async def fortune_stream(request: FortuneRequest):
+    """Newline-delimited JSON events: {"event": ..., "data": ...} per line"""
+    service = app.state.service
+
+    def lines():
+        # StreamingResponse chạy generator đồng bộ này trong threadpool
+        try:
+            for event, payload in service.stream(request.query, request.fortune_number):
+                yield json.dumps({"event": event, "data": payload}, ensure_ascii=False, default=str) + "\n"
+        except Exception as e:
+            print(f"Fortune stream failed: {e}")
+            yield json.dumps({"event": "error", "data": {"message": str(e)}}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/admin/reload")
+async def reload_workbook(force: bool = False):
+    """Check the workbook source now (only reaches the worker that gets this request)"""
+    result = await run_in_threadpool(app.state.service.reload, force)
+    return {"changed": result.changed, "seconds": result.seconds, "version": str(result.version)}
+
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and answering"""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once this worker's warm-up has finished, 503 with its progress until then"""
+    status = app.state.service.ready()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/queue")
+async def queue():
+    """This worker's Gemini queue: waiting / running tickets, concurrency limit, service time"""
+    return app.state.service.queue()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage latencies of this worker in Prometheus text format"""
+    return METRICS.prometheus_text()
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "api:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", 8000)),
+        workers=api_workers(),
+    )
@@ -1,26 +1,14 @@
 """
 Year-End Party Chatbot with Zodiac Theme - Enhanced UI Version
 """
-from urllib import response
+# Chỉ import nhẹ ở đây: langchain / google-genai / office365 / pandas được nạp
+# trong fortune_service, workbook khi thật sự cần (xem test_modules/cold_start_benchmark.py)
 import streamlit as st
-import pandas as pd
-pd.set_option('display.max_columns', None)
-pd.set_option('display.max_colwidth', None)
-import json
-from io import BytesIO
-from google import genai
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
-from office365.sharepoint.client_context import ClientContext
-from office365.runtime.auth.user_credential import UserCredential
-from office365.sharepoint.files.file import File
 from dotenv import load_dotenv
 import os
-import time
-import random
-import html
-import re
+from render import stars_html, zodiac_wheel_html
+from static_assets import start_asset_server
+from fortune_client import make_client
 
 load_dotenv()
 
@@ -204,198 +192,39 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ==================== Background Elements ====================
-# Add stars
-random.seed(42)
-stars_html = '<div class="stars-bg">'
-for i in range(50):
-    x = random.randint(0, 100)
-    y = random.randint(0, 100)
-    size = random.randint(2, 4)
-    delay = random.uniform(0, 3)
-    stars_html += f'<div class="star" style="left:{x}%; top:{y}%; width:{size}px; height:{size}px; animation-delay:{delay}s;"></div>'
-stars_html += '</div>'
-random.seed()
-st.markdown(stars_html, unsafe_allow_html=True)
-
-with open(r"D:\KenIChi\Chatbot\data\images\zodiac_signs\1.svg", "r", encoding="utf-8") as f:
-    leo_svg = f.read()
-
-# Add zodiac wheel
-import base64
-def render_svg(svg_file, width=50, height=50):
-    with open(svg_file, "r") as f:
-        lines = f.readlines()
-    svg = "".join(lines)
-    b64 = base64.b64encode(svg.encode("utf-8")).decode("utf-8")
-    html = f'<img src="data:image/svg+xml;base64,{b64}" width="{width}" height="{height}"/>'
-    return html
-
-zodiac_symbols = ['♈', '♉', '♊', '♋', '♌', '♍', '♎', '♏', '♐', '♑', '♒', '♓']
-zodiac_svg_path = r"D:\KenIChi\Chatbot\data\images\zodiac_signs"
-zodiac_svg_files = [f"{zodiac_svg_path}\\{file}" for file in ["1.svg", "2.svg", "3.svg", "4.svg", "5.svg", "6.svg", "7.svg", "8.svg", "9.svg", "10.svg", "11.svg", "12.svg"]]
-zodiac_html = [render_svg(file, width=200, height=200) for file in zodiac_svg_files]
-wheel_html = '<div class="zodiac-wheel"><div class="zodiac-wheel-inner">'
-for i, symbol in enumerate(zodiac_html):
-    angle = i * 30
-    wheel_html += f'''<div class="zodiac-symbol" style="transform: translate(-50%, -50%) rotate({angle}deg) translateY(-450px) rotate(-{angle}deg);">
-        {symbol}
-    </div>'''
-wheel_html += '</div></div>'
-st.markdown(wheel_html, unsafe_allow_html=True)
-
-# ==================== Functions ====================
-@st.cache_resource(show_spinner=False)
-def get_ai_model():
-    """Initialize AI modelt (cached)"""
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-    model = ChatGoogleGenerativeAI(
-        model=os.getenv("AI_MODEL"),
-        api_key=os.getenv("GEMINI_API_KEY"),
-        temperature=1.0,
-        max_output_tokens=2000,
-        thinking_level="minimal",
-        thinking_budget=0,
-        include_thoughts=False,
-    )
-    return model
-
-@st.cache_resource(show_spinner=False)
-def connect_to_sharepoint(refresh_key=0):
-    """Connect to SharePoint and download Excel file"""
-    site_url = os.getenv(
-        "SHAREPOINT_SITE_URL",
-        "https://mabmotor-my.sharepoint.com/personal/vnm13649_mabuchi-motor_com"
-    )
-    username = os.getenv("MICROSOFT_ACCOUNT")
-    password = os.getenv("MICROSOFT_PASSWORD")
-    file_relative_url = os.getenv(
-        "SHAREPOINT_FILE_URL",
-        "/personal/vnm13649_mabuchi-motor_com/Documents/Microsoft Teams Chat Files/guest_information 1.xlsx"
-    )
-    
-    ctx = ClientContext(site_url).with_credentials(
-        UserCredential(username, password)
-    )
-    
-    response = File.open_binary(ctx, file_relative_url)
-    file_stream = BytesIO(response.content)
-    
-    file_stream.seek(0)
-    raw = file_stream.getvalue()
-    xls = pd.ExcelFile(file_stream)
-
-    df = pd.read_excel(xls, "participants_profile")
-    company_context = pd.read_excel(xls, "company_context")
-    role_definition = pd.read_excel(xls, "role_definition")
-    
-    print("REFRESH KEY:", refresh_key)
-    print("DOWNLOAD AT:", time.time())
-    print("FILE SIZE:", len(raw))
-    return df, company_context['text'][0], role_definition['text'][0]
-
 @st.cache_resource(show_spinner=False)
-def get_participant_by_id(user_id, use_sharepoint=True):
-    """Get participant data by ID"""
+def get_static_assets():
+    """Images served by URL from a side server; None keeps them inline"""
+    base_url = os.getenv("STATIC_ASSETS_URL")
+    if not base_url:
+        return None
     try:
-        fix_response = None
-        text_to_inject = None
-        if use_sharepoint:
-            df, company_context, role_definition = connect_to_sharepoint(st.session_state.refresh)
-        else:
-            df = pd.read_excel("data/guest_information.xlsx", sheet_name="participants_profile")
-            company_context, role_definition = load_context_files()
-            
-        if isinstance(user_id, int) or ((isinstance(user_id, str) and user_id.isdigit())):      
-            result = df[df["id"] == int(user_id)]
-        elif isinstance(user_id, str):
-            result = df[df["name"].str.lower().str.strip() == user_id.lower().strip()]
-        else:
-            st.error("Nhập MSNV hoặc tên hợp lệ!")
-            return None
-            
-        if result.empty:
-            st.error("Không tìm thấy người này!")
-            return None
-        
-        data = result.iloc[0].to_dict()
-        data = {k: (None if pd.isna(v) else v) for k, v in data.items()}
-        
-        if "fixed_response" in data:
-            fix_response = data["fixed_response"]
-            del data["fixed_response"]
-        
-        if "text_to_inject" in data:
-            text_to_inject = data["text_to_inject"]
-            del data["text_to_inject"]
-        
-        return data, company_context, role_definition, fix_response, text_to_inject
-        
-    except Exception as e:
-        st.error(f"Lỗi khi lấy dữ liệu: {str(e)}")
+        return start_asset_server(base_url, int(os.getenv("STATIC_ASSETS_PORT", 8765)))
+    except OSError as e:
+        print(f"Static asset server not started: {e}")
         return None
 
-@st.cache_data
-@st.cache_resource(show_spinner=False)
-def load_context_files():
-    """Load company context and role definitions"""
-    try:         
-        with open("data\\company_context.txt", "r", encoding="utf-8") as f:
-            company_context = f.read()
-    except:
-        company_context = ""
-    
-    try:
-        with open("data\\role_definition.txt", "r", encoding="utf-8") as f:
-            role_definition = f.read()
-    except:
-        role_definition = ""
-    
-    return company_context, role_definition
+# ==================== Background Elements ====================
+# Star field and zodiac wheel are built once per process (render.py)
+st.markdown(stars_html(), unsafe_allow_html=True)
+st.markdown(zodiac_wheel_html(False, get_static_assets()), unsafe_allow_html=True)
 
-def generate_response(user_data, model, company_context, role_definition, text_to_inject=None):
-    if user_data['nationality'] == 'JP':
-        language = "Tiếng Anh"
-        user_prompt = "Vì đây là người Nhật, hãy trả lời bằng tiếng Anh một cách tự nhiên và thân thiện dựa vào thông tin của họ:"
-    else:
-        language = "Tiếng Việt"
-        user_prompt = "Đây là thông tin cá nhân của người dùng:"
-        
-    if text_to_inject:
-        text_to_inject = f"\nHãy đảm bảo câu bói của bạn có chứa thông tin sau đây: {text_to_inject}"
-    else:
-        text_to_inject = ""
-        
-    system_prompt = f"""Bạn là một chatbot bói toán hài hước, thông minh, nói chuyện lưu loát dùng để giải trí trong buổi tiệc tất niên của công ty.
-Bạn sẽ dựa vào thông tin cá nhân của người dùng để đưa ra câu bói ngắn gọn, dễ hiểu, hài hước và thú vị.
-Hãy chắc chắn rằng câu bói của bạn liên quan trực tiếp đến thông tin cá nhân của người dùng.
-Hãy nhớ rằng câu bói của bạn đưa ra là cho năm 2026 (năm Bính Ngọ) nếu bạn cần tham khảo năm.
-Hãy sử dụng ngôn ngữ tự nhiên, thân thiện và gần gũi, xưng hô "Tôi" và "Bạn".
-Hãy thêm vài icon lung linh vào câu bói để tăng độ hấp dẫn, hoặc icon liên quan đến nội dung câu bói.
-Hãy tránh sử dụng các cụm từ quá trang trọng hoặc kỹ thuật.
-Hãy giữ câu bói dưới 200 từ.
-Hãy trả lời bằng {language}."""
+# ==================== Functions ====================
+@st.cache_resource(show_spinner=False)
+def get_fortune_client():
+    """Fortune service over HTTP when FORTUNE_API_URL is set, else the same pipeline in this process"""
+    return make_client(os.getenv, use_sharepoint=True, usage_source="app_hybrid")
 
-    template = ChatPromptTemplate([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=[
-            {"type": "text", "text": "Hãy sử dụng bối cảnh công ty sau đây để hiểu về văn hóa và môi trường làm việc của công ty: "},
-            {"type": "text", "text": company_context},
-            {"type": "text", "text": "Hãy sử dụng định nghĩa vai trò sau đây để hiểu về các vị trí công việc trong công ty: "},
-            {"type": "text", "text": role_definition},
-            {"type": "text", "text": user_prompt},
-            {"type": "text", "text": json.dumps(user_data, ensure_ascii=False)},
-            {"type": "text", "text": text_to_inject},
-            {"type": "text", "text": "\nHãy tạo một câu bói vui nhộn và may mắn cho người này!"}
-        ])
-    ])
-    
-    response = model.invoke(template.format_messages())
-    print(response)
-    return response
+def pick_candidate(key):
+    """Button callback for the "did you mean" list"""
+    st.session_state.picked_key = key
+    st.session_state.candidates = None
 
 # ==================== Main UI ====================
 def main():
+    # Lượt render đầu tiên tạo service, warm-up chạy nền trước khi khách nhập MSNV
+    get_fortune_client()
+
     # Header
     st.markdown("""
     <div style='text-align: center; padding: 40px 20px; position: relative; z-index: 1;'>
@@ -459,29 +288,36 @@ def main():
     
     # Reload button
     if st.button("🔄 Reload Excel from SharePoint"):
-        st.cache_data.clear()
-        st.session_state.refresh = st.session_state.get('refresh', 0) + 1
         with st.spinner("⏳ Loading data..."):
-            time.sleep(2)
-        st.success("✅ Done!")
+            fetch = get_fortune_client().reload()
+        if fetch.changed:
+            st.success(f"✅ Done! Reloaded in {fetch.seconds:.1f}s")
+        else:
+            st.success(f"✅ No changes ({fetch.seconds * 1000:.0f} ms)")
+    
+    # A name picked from the "did you mean" list stands in for the typed text
+    picked_key = st.session_state.pop('picked_key', None)
+    if submit:
+        st.session_state.candidates = None
     
     # Process
-    if submit and user_id:
+    if (submit or picked_key) and user_id:
         with st.spinner("🔮 Reading your office destiny..."):
-            result = get_participant_by_id(user_id, True)
+            try:
+                result = get_fortune_client().fortune(picked_key or user_id)
+            except Exception as e:
+                st.error(f"Lỗi khi lấy dữ liệu: {str(e)}")
+                result = None
             
             if result:
-                user_data, company_context, role_definition, fixed_response, text_to_inject = result
+                if result["candidates"]:
+                    st.session_state.candidates = [(c["key"], c["name"], c["team"]) for c in result["candidates"]]
+                elif result["participant"] is None:
+                    st.error("Không tìm thấy người này!")
                 
-                if user_data:
-                    model = get_ai_model()
-                    
-                    if fixed_response is not None:
-                        response = fixed_response
-                    else:
-                        ai_response = generate_response(user_data, model, company_context, role_definition, text_to_inject)
-                        print(ai_response)
-                        response = ai_response.content[0]['text']
+                if result["participant"]:
+                    user_data = result["participant"]["data"]
+                    response = result["response"]
                     
                     # Display result - Header section
                     team_html = f'''<p style='
@@ -537,15 +373,20 @@ def main():
     elif submit:
         st.warning("⚠️ Please enter your Employee ID or Full Name!")
     
+    # Several names match the typed text: let the guest pick one
+    if st.session_state.get('candidates'):
+        st.markdown("<h4 style='color: #fde047; text-align: center;'>🤔 Did you mean...</h4>", unsafe_allow_html=True)
+        for i, (key, name, team) in enumerate(st.session_state.candidates):
+            label = f"{name} – {team}" if team else name
+            st.button(label, key=f"pick_{i}", on_click=pick_candidate, args=(key,))
+    
     # Footer
     st.markdown("""
     <div style='text-align: center; color: #22d3ee; margin-top: 48px; padding: 24px;'>
-        <p style='margin-bottom: 8px;'>💡 <strong>Note:</strong> Please enter your full name with accents or your employee ID</p>
+        <p style='margin-bottom: 8px;'>💡 <strong>Note:</strong> Please enter your employee ID or your name, with or without accents</p>
         <p>Made with ❤️ for Year-End Party 2025</p>
     </div>
     """, unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    if "refresh" not in st.session_state:
-        st.session_state.refresh = 0
     main()
\ No newline at end of file
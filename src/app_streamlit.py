@@ -6,26 +6,17 @@ Year-End Party Chatbot - Streamlit Cloud Version
 This version is optimized for Streamlit Cloud deployment.
 Uses st.secrets instead of .env file.
 """
+# Chỉ import nhẹ ở đây: langchain / google-genai / office365 / pandas được nạp
+# trong fortune_service, workbook khi thật sự cần (xem test_modules/cold_start_benchmark.py)
 import streamlit as st
-import pandas as pd
-pd.set_option('display.max_columns', None)
-pd.set_option('display.max_colwidth', None)
-import json
-from io import BytesIO
-from google import genai
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
-from office365.sharepoint.client_context import ClientContext
-from office365.runtime.auth.user_credential import UserCredential
-from office365.sharepoint.files.file import File
 import os
 import time
-import random
-import html
-import re
-import base64
 import streamlit.components.v1 as components
+from render import queue_ticket_html, result_card_html, stars_html, zodiac_wheel_html
+from static_assets import start_asset_server
+from metrics import METRICS, start_metrics_server
+from fortune_client import make_client
+from speculation import Speculation
 
 # ==================== Page Config ====================
 st.set_page_config(
@@ -157,6 +148,10 @@ st.markdown("""
         animation: slideUp 0.6s ease-out;
     }
     
+    .result-container.no-animation {
+        animation: none;
+    }
+    
     /* Stars background */
     .stars-bg {
         position: fixed;
@@ -335,70 +330,6 @@ components.html("""
 </script>
 """, height=0)
 
-# ==================== Background Elements ====================
-# Initialize loading state
-if 'is_loading' not in st.session_state:
-    st.session_state.is_loading = False
-if 'result_showing' not in st.session_state:
-    st.session_state.result_showing = False
-
-# Add stars with loading class if in loading state
-loading_class = "loading" if st.session_state.is_loading else ""
-random.seed(42)
-stars_html = f'<div class="stars-bg {loading_class}">'
-for i in range(50):
-    x = random.randint(0, 100)
-    y = random.randint(0, 100)
-    size = random.randint(2, 4)
-    delay = random.uniform(0, 3)
-    stars_html += f'<div class="star" style="left:{x}%; top:{y}%; width:{size}px; height:{size}px; animation-delay:{delay}s;"></div>'
-stars_html += '</div>'
-random.seed()
-st.markdown(stars_html, unsafe_allow_html=True)
-
-
-# Add zodiac wheel with emoji symbols (cross-platform compatible)
-from pathlib import Path
-
-def render_svg(svg_file, width=50, height=50):
-    """Render SVG file to base64 HTML, returns None if file not found"""
-    try:
-        with open(svg_file, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        svg = "".join(lines)
-        b64 = base64.b64encode(svg.encode("utf-8")).decode("utf-8")
-        html = f'<img src="data:image/svg+xml;base64,{b64}" width="{width}" height="{height}"/>'
-        return html
-    except FileNotFoundError:
-        return None
-
-# Try to load SVG files, fallback to emoji if not found
-zodiac_emoji = ['♈', '♉', '♊', '♋', '♌', '♍', '♎', '♏', '♐', '♑', '♒', '♓']
-
-# Get the directory where this script is located
-script_dir = Path(__file__).parent.resolve()
-zodiac_svg_path = script_dir.parent / "data" / "images" / "zodiac_signs"
-
-zodiac_html = []
-for i in range(1, 13):
-    svg_file = zodiac_svg_path / f"{i}.svg"
-    rendered = render_svg(svg_file, width=200, height=200)
-    if rendered:
-        zodiac_html.append(rendered)
-    else:
-        # Fallback to emoji if SVG not found
-        zodiac_html.append(f'<span style="font-size: 80px;">{zodiac_emoji[i-1]}</span>')
-
-# Build zodiac wheel with loading class if in loading state
-wheel_html = f'<div class="zodiac-wheel {loading_class}"><div class="zodiac-wheel-inner">'
-for i, symbol in enumerate(zodiac_html):
-    angle = i * 30
-    wheel_html += f'''<div class="zodiac-symbol" style="transform: translate(-50%, -50%) rotate({angle}deg) translateY(-450px) rotate(-{angle}deg);">
-        {symbol}
-    </div>'''
-wheel_html += '</div></div>'
-st.markdown(wheel_html, unsafe_allow_html=True)
-
 def get_secret(key, default=None):
     """Get secret from Streamlit secrets or environment variable"""
     try:
@@ -406,166 +337,73 @@ def get_secret(key, default=None):
     except:
         return os.getenv(key, default)
 
-# ==================== Functions ====================
 @st.cache_resource(show_spinner=False)
-def get_ai_model():
-    """Initialize AI model (cached)"""
-    model = ChatGoogleGenerativeAI(
-        model=get_secret("AI_MODEL"),
-        api_key=get_secret("GEMINI_API_KEY"),
-        temperature=1.0,
-        max_output_tokens=2000,
-        # thinking_level="minimal",
-        # thinking_budget=0,
-        # include_thoughts=False,
-    )
-    # print(model)
-    return model
+def get_static_assets():
+    """Images served by URL from a side server; None keeps them inline (e.g. on Streamlit Cloud)"""
+    base_url = get_secret("STATIC_ASSETS_URL")
+    if not base_url:
+        return None
+    try:
+        return start_asset_server(base_url, int(get_secret("STATIC_ASSETS_PORT", 8765)))
+    except OSError as e:
+        print(f"Static asset server not started: {e}")
+        return None
 
-@st.cache_resource(show_spinner=False)
-def connect_to_sharepoint(refresh_key=0):
-    """Connect to SharePoint and download Excel file"""
-    site_url = get_secret(
-        "SHAREPOINT_SITE_URL",
-        "https://mabmotor-my.sharepoint.com/personal/vnm13649_mabuchi-motor_com"
-    )
-    username = get_secret("MICROSOFT_ACCOUNT")
-    password = get_secret("MICROSOFT_PASSWORD")
-    file_relative_url = get_secret(
-        "SHAREPOINT_FILE_URL",
-        "/personal/vnm13649_mabuchi-motor_com/Documents/Microsoft Teams Chat Files/guest_information 1.xlsx"
-    )
-    
-    ctx = ClientContext(site_url).with_credentials(
-        UserCredential(username, password)
-    )
-    
-    response = File.open_binary(ctx, file_relative_url)
-    file_stream = BytesIO(response.content)
-    
-    file_stream.seek(0)
-    raw = file_stream.getvalue()
-    xls = pd.ExcelFile(file_stream)
+# ==================== Background Elements ====================
+# Initialize loading state
+if 'is_loading' not in st.session_state:
+    st.session_state.is_loading = False
+if 'result_showing' not in st.session_state:
+    st.session_state.result_showing = False
 
-    df = pd.read_excel(xls, "participants_profile")
-    company_context = pd.read_excel(xls, "company_context")
-    role_definition = pd.read_excel(xls, "role_definition")
-    
-    return df, company_context['text'][0], role_definition['text'][0]
+# Star field and zodiac wheel are built once per process (render.py), one variant per loading state;
+# the SVGs are linked from the static asset server when STATIC_ASSETS_URL is set
+st.markdown(stars_html(st.session_state.is_loading), unsafe_allow_html=True)
+st.markdown(zodiac_wheel_html(st.session_state.is_loading, get_static_assets()), unsafe_allow_html=True)
 
+# ==================== Functions ====================
 @st.cache_resource(show_spinner=False)
-def get_participant_by_id(user_id, use_sharepoint=True):
-    """Get participant data by ID"""
-    try:
-        fix_response = None
-        text_to_inject = None
-        if use_sharepoint:
-            print("use sharepoint mode")
-            df, company_context, role_definition = connect_to_sharepoint(st.session_state.refresh)
-        else:
-            print("use local mode")
-            df = pd.read_excel("data/guest_information.xlsx", sheet_name="participants_profile")
-            company_context = pd.read_excel("data/guest_information.xlsx", sheet_name="company_context")
-            role_definition = pd.read_excel("data/guest_information.xlsx", sheet_name="role_definition")
-            company_context = company_context['text'][0]
-            role_definition = role_definition['text'][0]
+def get_fortune_client():
+    """Fortune service over HTTP when FORTUNE_API_URL is set, else the same pipeline in this process"""
+    return make_client(get_secret, use_sharepoint=False, usage_source="app_streamlit")
 
-        if isinstance(user_id, int) or ((isinstance(user_id, str) and user_id.isdigit())):      
-            result = df[df["id"] == int(user_id)]
-        elif isinstance(user_id, str):
-            result = df[df["name"].str.lower().str.strip() == user_id.lower().strip()]
-        else:
-            st.error("Nhập MSNV hoặc tên hợp lệ!")
-            return None
-            
-        if result.empty:
-            st.error("Không tìm thấy người này!")
-            return None
-        
-        data = result.iloc[0].to_dict()
-        data = {k: (None if pd.isna(v) else v) for k, v in data.items()}
-        
-        if "fixed_response" in data:
-            fix_response = data["fixed_response"]
-            del data["fixed_response"]
-        
-        if "text_to_inject" in data:
-            text_to_inject = data["text_to_inject"]
-            del data["text_to_inject"]
-        
-        return data, company_context, role_definition, fix_response, text_to_inject
-        
-    except Exception as e:
-        st.error(f"Lỗi khi lấy dữ liệu: {str(e)}")
-        return None
-
-@st.cache_data
 @st.cache_resource(show_spinner=False)
-def load_context_files():
-    """Load company context and role definitions"""
-    try:         
-        with open("data\\company_context.txt", "r", encoding="utf-8") as f:
-            company_context = f.read()
-    except:
-        company_context = ""
-    
-    try:
-        with open("data\\role_definition.txt", "r", encoding="utf-8") as f:
-            role_definition = f.read()
-    except:
-        role_definition = ""
-    
-    return company_context, role_definition
+def get_metrics():
+    """Stage latency registry; /metrics, /health and /ready served on METRICS_PORT (0 disables the endpoint)"""
+    METRICS.log_path = get_secret("METRICS_LOG_PATH", METRICS.log_path)
+    port = int(get_secret("METRICS_PORT", 9464))
+    if port:
+        try:
+            start_metrics_server(METRICS, port, readiness=get_fortune_client().ready)
+        except OSError as e:
+            print(f"Metrics endpoint not started: {e}")
+    return METRICS
 
-def generate_response(user_data, model, company_context, role_definition, text_to_inject=None, fortune_number=None):
-    if user_data['nationality'] == 'JP':
-        language = "Tiếng Anh"
-        user_prompt = "Vì đây là người Nhật, hãy trả lời bằng tiếng Anh một cách tự nhiên và thân thiện dựa vào thông tin của họ:"
-    else:
-        language = "Tiếng Việt"
-        user_prompt = "Đây là thông tin cá nhân của người dùng:"
-        
-    if text_to_inject:
-        text_to_inject = f"\nHãy đảm bảo câu bói của bạn có chứa thông tin sau đây: {text_to_inject}"
-    else:
-        text_to_inject = ""
-    
-    # Build fortune prompt based on whether fortune_number is provided
-    if fortune_number and fortune_number.strip():
-        fortune_prompt = f"\nNgười chơi này vừa gieo quẻ trúng số {fortune_number}, hãy kết hợp với thông tin được cho trước, Hãy tạo một câu bói vui nhộn và may mắn cho người này!"
-    else:
-        fortune_prompt = "\nHãy tạo một câu bói vui nhộn và may mắn cho người này!"
-        
-    system_prompt = f"""Bạn là một chatbot bói toán hài hước, thông minh, nói chuyện lưu loát dùng để giải trí trong buổi tiệc tất niên của công ty.
-Bạn sẽ dựa vào thông tin cá nhân của người dùng để đưa ra câu bói ngắn gọn, dễ hiểu, hài hước và thú vị.
-Hãy chắc chắn rằng câu bói của bạn liên quan trực tiếp đến thông tin cá nhân của người dùng.
-Hãy nhớ rằng câu bói của bạn đưa ra là cho năm 2026 (năm Bính Ngọ) nếu bạn cần tham khảo năm.
-Hãy sử dụng ngôn ngữ tự nhiên, thân thiện và gần gũi, xưng hô "Tôi" và "Bạn".
-Hãy thêm vài icon lung linh vào câu bói để tăng độ hấp dẫn, hoặc icon liên quan đến nội dung câu bói.
-Hãy tránh sử dụng các cụm từ quá trang trọng hoặc kỹ thuật.
-Hãy giữ câu bói dưới 200 từ.
-Hãy trả lời bằng {language}."""
+def speculate():
+    """on_change of the inputs: start the fortune for the typed ID / number in the background"""
+    # secrets.toml có thể ghi 1 / true thay vì chuỗi "1"
+    enabled = str(get_secret("SPECULATIVE_GENERATION", "1")).strip().lower() in ("1", "true", "yes")
+    if not enabled or st.session_state.result_showing:
+        return
+    user_id = st.session_state.get('user_id_input', "")
+    fortune_number = st.session_state.get('fortune_number_input', "")
+    previous = st.session_state.get('speculation')
+    if previous is not None:
+        if previous.matches(user_id, fortune_number):
+            return
+        previous.cancel()
+    st.session_state.speculation = Speculation(get_fortune_client(), user_id, fortune_number).start() if user_id.strip() else None
 
-    template = ChatPromptTemplate([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=[
-            {"type": "text", "text": "Hãy sử dụng bối cảnh công ty sau đây để hiểu về văn hóa và môi trường làm việc của công ty: "},
-            {"type": "text", "text": company_context},
-            {"type": "text", "text": "Hãy sử dụng định nghĩa vai trò sau đây để hiểu về các vị trí công việc trong công ty: "},
-            {"type": "text", "text": role_definition},
-            {"type": "text", "text": user_prompt},
-            {"type": "text", "text": json.dumps(user_data, ensure_ascii=False)},
-            {"type": "text", "text": text_to_inject},
-            {"type": "text", "text": fortune_prompt}
-        ])
-    ])
-    print(template.format_messages())
-    response = model.invoke(template.format_messages())
-    # print(response)
-    return response
+def pick_candidate(key):
+    """Button callback for the "did you mean" list"""
+    st.session_state.picked_key = key
+    st.session_state.candidates = None
 
 # ==================== Main UI ====================
 def main():
+    # Lượt render đầu tiên tạo service (warm-up chạy nền) và mở /ready cho kiosk
+    get_metrics()
+
     # Header
     st.markdown("""
     <div style='text-align: center; padding: 40px 20px; position: relative; z-index: 1;'>
@@ -610,114 +448,122 @@ def main():
     # Input section
     st.markdown("<h3 style='color: #fde047; text-align: center; margin: 30px 0 20px 0;'>🌙 Enter your Full Name or Employee ID ✨</h3>", unsafe_allow_html=True)
     
-    with st.form(key="user_input_form"):
-        col1, col2, col3 = st.columns([3, 1, 1])
-        with col1:
-            user_id = st.text_input(
-                "Employee ID or Name",
-                placeholder="E.g.: 45678 or Nobita, Shizuka",
-                key="user_id_input",
-                label_visibility="collapsed",
-            )
-        
-        with col2:
-            fortune_number = st.text_input(
-                "Fortune Number",
-                placeholder="Số quẻ",
-                key="fortune_number_input",
-                label_visibility="collapsed",
-            )
-        
-        with col3:
-            submit = st.form_submit_button("🪄 Go for it!")
+    # Ô nhập nằm ngoài form để on_change bắt đầu đoán trước ngay khi nhập xong
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        user_id = st.text_input(
+            "Employee ID or Name",
+            placeholder="E.g.: 45678 or Nobita, Shizuka",
+            key="user_id_input",
+            label_visibility="collapsed",
+            on_change=speculate,
+        )
+    
+    with col2:
+        fortune_number = st.text_input(
+            "Fortune Number",
+            placeholder="Số quẻ",
+            key="fortune_number_input",
+            label_visibility="collapsed",
+            on_change=speculate,
+        )
+    
+    with col3:
+        submit = st.button("🪄 Go for it!")
+    
+    # A name picked from the "did you mean" list stands in for the typed text
+    picked_key = st.session_state.pop('picked_key', None)
+    if submit:
+        st.session_state.candidates = None
     
     # Process - only if result is NOT already showing
-    if submit and user_id and not st.session_state.result_showing:
+    if (submit or picked_key) and user_id and not st.session_state.result_showing:
         st.session_state.is_loading = True
+        card = st.empty()
         with st.spinner("🔮 Reading your office destiny..."):
             start_time = time.time()
-            result = get_participant_by_id(user_id, False)
+            timings = get_metrics().start()
+            user_data = response = None
+            streamed = False
+            text = ""
+            last_render = 0
+            # Đã đoán trước đúng ID / số quẻ này thì nhận lấy kết quả đang chạy
+            speculation = st.session_state.pop('speculation', None)
+            events = None
+            if speculation is not None:
+                if not picked_key and speculation.matches(user_id, fortune_number):
+                    events = speculation.claim()
+                else:
+                    speculation.cancel()
+            timings.labels["speculation"] = "hit" if events is not None else "miss"
+            if events is None:
+                events = get_fortune_client().stream(picked_key or user_id, fortune_number, timings)
+            try:
+                for event, payload in events:
+                    if event == "participant":
+                        user_data = payload["data"]
+                    elif event == "candidates":
+                        st.session_state.candidates = [(c["key"], c["name"], c["team"]) for c in payload]
+                    elif event == "not_found":
+                        st.error("Không tìm thấy người này!")
+                    elif event == "queued":
+                        # Đang xếp hàng chờ Gemini: hiện số vé, vị trí và thời gian chờ ước tính
+                        card.markdown(queue_ticket_html(payload), unsafe_allow_html=True)
+                    elif event == "delta":
+                        text += payload
+                        streamed = True
+                        # Vẽ lại thẻ kết quả tối đa ~10 lần/giây
+                        if time.time() - last_render > 0.1:
+                            with timings.stage("render"):
+                                card.markdown(result_card_html(user_data, text, animate=False), unsafe_allow_html=True)
+                            last_render = time.time()
+                    elif event == "done":
+                        response = payload["response"]
+            except Exception as e:
+                st.error(f"Lỗi khi lấy dữ liệu: {str(e)}")
             
-            if result:
-                user_data, company_context, role_definition, fixed_response, text_to_inject = result
+            if user_data and response is not None:
+                print("=== RESPONSE ===")
+                print(response)
+                print("Total time in ms:", (time.time() - start_time) * 1000)
                 
-                if user_data:
-                    model = get_ai_model()
-                    
-                    if fixed_response is not None and fixed_response.strip() != "":
-                        response = fixed_response
-                    else:
-                        ai_response = generate_response(user_data, model, company_context, role_definition, text_to_inject, fortune_number)
-                        response = ai_response.content[0]['text']
-                    
-                    print("=== RESPONSE ===")
-                    print(response)
-                    print("Total time in ms:", (time.time() - start_time) * 1000)
-                    
-                    # Save result to session state
-                    st.session_state.last_result = {
-                        'user_data': user_data,
-                        'response': response
-                    }
-                    st.session_state.result_showing = True
-                    st.session_state.is_loading = False
-                    st.rerun()  # Rerun to show result with correct button state
+                # Save result to session state; timings finish once the card is drawn after the rerun
+                st.session_state.last_result = {
+                    'user_data': user_data,
+                    'response': response,
+                    'streamed': streamed,
+                    'timings': timings
+                }
+                st.session_state.result_showing = True
+                st.session_state.is_loading = False
+                st.rerun()  # Rerun to show result with correct button state
+            
+            st.session_state.is_loading = False
+            get_metrics().finish(timings)
     
     elif submit and not user_id:
         st.warning("⚠️ Please enter your Employee ID or Full Name!")
     
+    # Several names match the typed text: let the guest pick one
+    if st.session_state.get('candidates') and not st.session_state.result_showing:
+        st.markdown("<h4 style='color: #fde047; text-align: center;'>🤔 Did you mean...</h4>", unsafe_allow_html=True)
+        for i, (key, name, team) in enumerate(st.session_state.candidates):
+            label = f"{name} – {team}" if team else name
+            st.button(label, key=f"pick_{i}", on_click=pick_candidate, args=(key,))
+    
     # Display result from session state (OUTSIDE processing block)
     if st.session_state.result_showing and st.session_state.get('last_result'):
         result_data = st.session_state.last_result
         user_data = result_data['user_data']
         response = result_data['response']
         
-        team_html = f'''<p style='
-                            color: #64748b; 
-                            margin-bottom: 24px; 
-                            font-size: 1.2rem;
-                            font-weight: bold;
-                        '>
-                            <strong>🏢 Nhóm:</strong> {user_data['team']}
-                        </p>''' if user_data.get('team') else "Khách mời"  
-        
-        st.markdown(f"""
-            <div class='result-container' style='
-                background: white; 
-                border-radius: 24px; 
-                padding: 32px; 
-                box-shadow: 0 8px 32px rgba(34, 211, 238, 0.3); 
-                margin: 32px auto; 
-                max-width: 800px;'>
-                <h2 style='
-                    font-size: 2rem; 
-                    color: #f59e0b; 
-                    margin-bottom: 16px; 
-                    border-bottom: 2px solid #fde047; 
-                    padding-bottom: 16px; 
-                    font-weight: bold;'>
-                    ✨ {user_data.get('name', 'Bạn')}
-                </h2>
-                {team_html}
-                <h3 style='
-                    font-size: 1.5rem; 
-                    color: #f59e0b; 
-                    margin-bottom: 16px;'>
-                    🔮 Lời bói của bạn:
-                </h3>
-                <div style='    
-                    background: linear-gradient(135deg, #fef3c7 0%, #fed7aa 100%); 
-                    padding: 24px; 
-                    border-radius: 16px; 
-                    border: 2px solid #fde047;'>
-                    <p style='
-                        color: #1f2937; 
-                        font-size: 1.1rem; 
-                        line-height: 1.8; 
-                        margin: 0;'>{response}</p>
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
+        timings = result_data.pop('timings', None)
+        if timings is not None:
+            with timings.stage("render"):
+                st.markdown(result_card_html(user_data, response, animate=not result_data.get('streamed')), unsafe_allow_html=True)
+            get_metrics().finish(timings)
+        else:
+            st.markdown(result_card_html(user_data, response, animate=not result_data.get('streamed')), unsafe_allow_html=True)
         
         # Show info message about disabled button
         # st.info("💡 Bấm nút bên dưới để bói cho người khác!")
@@ -738,6 +584,4 @@ def main():
     """, unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    if "refresh" not in st.session_state:
-        st.session_state.refresh = 0
     main()
\ No newline at end of file
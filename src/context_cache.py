@@ -0,0 +1,178 @@
+"""
+Provider-side context caching for the static prompt prefix (system prompt +
+company_context + role_definition), one cache per language.
+
+The prefix is registered once, its TTL is renewed before it runs out, and it is
+replaced when the workbook content changes. Generation falls back to sending the
+full prompt whenever no cache is available (e.g. prefix below the provider minimum).
+"""
+import hashlib
+import threading
+import time
+from functools import lru_cache
+
+from fortune import build_prefix
+
+
+class GeminiContextCacheProvider:
+    """Context caches through the google-genai client"""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self._client_instance = None
+
+    @property
+    def _client(self):
+        # google-genai chỉ được nạp khi tạo cache lần đầu, không phải lúc khởi động app
+        if self._client_instance is None:
+            from google import genai
+            self._client_instance = genai.Client(api_key=self.api_key)
+        return self._client_instance
+
+    def create(self, model, system_instruction, texts, ttl_seconds, display_name=None):
+        from google.genai import types
+        cache = self._client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                display_name=display_name,
+                system_instruction=system_instruction,
+                contents=[types.Content(role="user", parts=[types.Part(text=text) for text in texts])],
+                ttl=f"{int(ttl_seconds)}s",
+            ),
+        )
+        return cache.name
+
+    def refresh(self, name, ttl_seconds):
+        from google.genai import types
+        self._client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{int(ttl_seconds)}s"))
+
+    def delete(self, name):
+        self._client.caches.delete(name=name)
+
+
+class LocalContextCacheProvider:
+    """In-memory stand-in for the provider, for checks without network"""
+
+    def __init__(self, min_chars=0, fail=False):
+        self.min_chars = min_chars
+        self.fail = fail
+        self.caches = {}
+        self.calls = []
+        self._counter = 0
+
+    def create(self, model, system_instruction, texts, ttl_seconds, display_name=None):
+        self.calls.append(("create", display_name))
+        if self.fail:
+            raise RuntimeError("context cache unavailable")
+        size = len(system_instruction) + sum(len(text) for text in texts)
+        if size < self.min_chars:
+            raise ValueError(f"cached content too small: {size} chars")
+        self._counter += 1
+        name = f"cachedContents/local-{self._counter}"
+        self.caches[name] = {
+            "model": model,
+            "system_instruction": system_instruction,
+            "texts": list(texts),
+            "expire_at": time.time() + ttl_seconds,
+        }
+        return name
+
+    def refresh(self, name, ttl_seconds):
+        self.calls.append(("refresh", name))
+        self.caches[name]["expire_at"] = time.time() + ttl_seconds
+
+    def delete(self, name):
+        self.calls.append(("delete", name))
+        self.caches.pop(name, None)
+
+
+@lru_cache(maxsize=8)
+def prefix_digest(language, company_context, role_definition):
+    """sha256 of a prompt prefix, hashed once per workbook version instead of per request"""
+    system_prompt, parts = build_prefix(language, company_context, role_definition)
+    return hashlib.sha256("\x00".join([system_prompt] + parts).encode("utf-8")).hexdigest()
+
+
+class PromptPrefixCache:
+    """Keeps one provider cache per language in sync with the current prompt prefix"""
+
+    def __init__(self, provider, model, ttl_seconds=3600, renew_margin=300, retry_after=600):
+        self.provider = provider
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.renew_margin = renew_margin
+        self.retry_after = retry_after
+        # language -> (prefix hash, cache name or None, expire_at / retry_at)
+        self._entries = {}
+        # Ngôn ngữ đang được tạo / gia hạn cache (đang gọi mạng)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def cached_content(self, language, company_context, role_definition):
+        """Cache name to pass as cached_content, or None to send the full prompt"""
+        digest = prefix_digest(language, company_context, role_definition)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(language)
+            current = entry is not None and entry[0] == digest
+            if current:
+                _, name, deadline = entry
+                if name is None and now < deadline:
+                    return None
+                if name is not None and now < deadline - self.renew_margin:
+                    return name
+            if language in self._pending:
+                # Request khác đang tạo / gia hạn: dùng cache còn hạn nếu có, không đứng chờ
+                return entry[1] if current and entry[1] and now < entry[2] else None
+            self._pending.add(language)
+
+        # Gọi mạng ngoài khóa để một lần gọi Gemini chậm không chặn các request khác
+        try:
+            result = None
+            if current and entry[1] is not None:
+                try:
+                    self.provider.refresh(entry[1], self.ttl_seconds)
+                    result = (digest, entry[1], now + self.ttl_seconds)
+                except Exception as e:
+                    print(f"Context cache refresh failed ({language}): {e}")
+            elif entry and entry[1]:
+                # Workbook đã đổi nội dung: bỏ cache cũ
+                self._delete(entry[1])
+            if result is None:
+                result = self._create(language, digest, company_context, role_definition, now)
+            with self._lock:
+                self._entries[language] = result
+            return result[1]
+        finally:
+            with self._lock:
+                self._pending.discard(language)
+
+    def _create(self, language, digest, company_context, role_definition, now):
+        """New (digest, name, expire_at) entry; name None (retry later) if the provider refuses"""
+        try:
+            system_prompt, parts = build_prefix(language, company_context, role_definition)
+            name = self.provider.create(self.model, system_prompt, parts, self.ttl_seconds,
+                                        display_name=f"fortune-{language}-{digest[:12]}")
+            print(f"Context cache created ({language}): {name}")
+            return (digest, name, now + self.ttl_seconds)
+        except Exception as e:
+            print(f"Context cache unavailable ({language}): {e}")
+            return (digest, None, now + self.retry_after)
+
+    def invalidate(self, company_context=None, role_definition=None):
+        """Drop every cache, or with the new workbook texts only those whose prefix changed"""
+        with self._lock:
+            stale = {language: entry for language, entry in self._entries.items()
+                     if company_context is None
+                     or entry[0] != prefix_digest(language, company_context, role_definition)}
+            for language in stale:
+                del self._entries[language]
+        for _, name, _ in stale.values():
+            if name:
+                self._delete(name)
+
+    def _delete(self, name):
+        try:
+            self.provider.delete(name)
+        except Exception as e:
+            print(f"Context cache delete failed: {e}")
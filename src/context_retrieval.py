@@ -0,0 +1,152 @@
+"""
+Relevance-filtered prompt context.
+
+company_context and role_definition are split into passages (one numbered item
+under its *** section *** header each) and indexed with BM25. For a guest, the
+passages matching their team, role and other profile fields are picked, best
+first after the general company passages (the first section of each text), until
+the token budget is used, and put back in document order. Near-duplicate
+passages (both sheets describe the departments) are kept once. Passages about
+other departments are left out, so the prompt stays small as the role sheet
+grows. When everything fits in the budget the texts are returned unchanged,
+which keeps the prompt prefix cacheable.
+"""
+import math
+import re
+from collections import Counter
+
+from name_search import fold_accents
+
+# Sheet hiện tại ~1400 token vẫn vừa (dùng chung context cache); chỉ lọc khi ngữ cảnh phình to
+DEFAULT_TOKEN_BUDGET = 4000
+# Tiếng Việt có dấu tốn token hơn tiếng Anh, ước lượng thô ~3 ký tự/token
+CHARS_PER_TOKEN = 3
+_WORD = re.compile(r"\w+")
+_SECTION = re.compile(r"^\s*\*{3}.*\*{3}\s*$")
+_ITEM = re.compile(r"^\s*\d+\.\s")
+# Trường không nói gì về phòng ban / vai trò
+_SKIP_FIELDS = {"id", "name", "fixed_response", "text_to_inject"}
+DUPLICATE_OVERLAP = 0.6
+
+
+def tokenize(text):
+    """Accent-folded word tokens"""
+    return _WORD.findall(fold_accents(text))
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def chunk_text(text):
+    """(section number, section header, passage) for each numbered item; the header
+    is the *** line plus any lines before the section's first item"""
+    chunks, header, current, section = [], [], [], 0
+    in_header = False
+
+    def flush():
+        body = "\n".join(current).strip()
+        if body:
+            chunks.append((section, "\n".join(header), body))
+        current.clear()
+
+    for line in str(text or "").splitlines():
+        if _SECTION.match(line):
+            flush()
+            if chunks or header:
+                section += 1
+            header, in_header = [line.strip()], True
+        elif _ITEM.match(line):
+            flush()
+            in_header = False
+            current.append(line)
+        elif in_header:
+            if line.strip():
+                header.append(line.strip())
+        else:
+            current.append(line)
+    flush()
+    return chunks
+
+
+def _overlap(a, b):
+    return len(a & b) / min(len(a), len(b)) if a and b else 0.0
+
+
+class BM25:
+    """Okapi BM25 over pre-tokenized documents"""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.frequencies = [Counter(tokens) for tokens in documents]
+        self.lengths = [len(tokens) for tokens in documents]
+        self.average_length = sum(self.lengths) / len(self.lengths) if documents else 0
+        document_frequency = Counter(token for tokens in documents for token in set(tokens))
+        n = len(documents)
+        self.idf = {token: math.log(1 + (n - df + 0.5) / (df + 0.5)) for token, df in document_frequency.items()}
+
+    def scores(self, query_tokens):
+        result = []
+        for frequencies, length in zip(self.frequencies, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length) if self.average_length else self.k1
+            for token in set(query_tokens):
+                tf = frequencies.get(token)
+                if tf:
+                    score += self.idf[token] * tf * (self.k1 + 1) / (tf + norm)
+            result.append(score)
+        return result
+
+
+class ContextRetriever:
+    """Built once per workbook version; select() picks the passages for one guest"""
+
+    def __init__(self, company_context, role_definition, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.company_context = company_context
+        self.role_definition = role_definition
+        self.token_budget = token_budget
+        self.fits = estimate_tokens(company_context or "") + estimate_tokens(role_definition or "") <= token_budget
+        # (source, section, header, text); source 0 = company_context, 1 = role_definition
+        self.passages = [(source, *chunk)
+                         for source, text in enumerate((company_context, role_definition))
+                         for chunk in chunk_text(text)]
+        tokens = [tokenize(body) for _, _, _, body in self.passages]
+        self.token_sets = [set(t) for t in tokens]
+        self.index = BM25(tokens)
+
+    def query(self, user_data):
+        """Search terms from the guest's profile (team, role, position...)"""
+        values = [value for field, value in user_data.items()
+                  if field not in _SKIP_FIELDS and isinstance(value, str) and value.strip()]
+        return tokenize(" ".join(values))
+
+    def select(self, user_data):
+        """(company_context, role_definition) trimmed to the passages relevant to this guest"""
+        if self.fits or not self.passages:
+            return self.company_context, self.role_definition
+        scores = self.index.scores(self.query(user_data))
+        general = [i for i, passage in enumerate(self.passages) if passage[1] == 0]
+        relevant = sorted((i for i in range(len(self.passages)) if scores[i] > 0 and i not in general),
+                          key=lambda i: (-scores[i], i))
+        chosen, used = [], 0
+        headers = set()
+        for i in general + relevant:
+            source, section, header, body = self.passages[i]
+            # Tiêu đề mục chỉ tốn token ở passage đầu tiên được chọn của mục đó
+            cost = estimate_tokens(body) + (0 if (source, section) in headers else estimate_tokens(header))
+            if used + cost > self.token_budget:
+                continue
+            if any(_overlap(self.token_sets[i], self.token_sets[j]) >= DUPLICATE_OVERLAP for j in chosen):
+                continue
+            chosen.append(i)
+            headers.add((source, section))
+            used += cost
+        selected, last = ([], []), None
+        for i in sorted(chosen):
+            source, section, header, body = self.passages[i]
+            if header and (source, section) != last:
+                selected[source].append(("\n" if selected[source] else "") + header)
+            selected[source].append(body)
+            last = (source, section)
+        return "\n".join(selected[0]), "\n".join(selected[1])
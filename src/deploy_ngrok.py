@@ -1,16 +1,65 @@
 """
 Simple deployment script with ngrok
+
+Starts the fortune service (api.py) and waits until its warm-up is done
+(/ready), then the Streamlit app as a thin client of it, and only opens the
+public URL once both answer. --in-process runs the pipeline inside Streamlit
+instead (warm-up then starts with the first session).
 """
+import json
 import os
 import subprocess
 import sys
 import time
+import urllib.error
+import urllib.request
 from pyngrok import ngrok
 from dotenv import load_dotenv
 import webbrowser
 
 load_dotenv()
 
+STREAMLIT_PORT = 8501
+
+
+def wait_until_ready(url, process, name, timeout=300):
+    """Poll url until it answers 200; prints warm-up progress from /ready. False on timeout or exit"""
+    deadline = time.time() + timeout
+    last = None
+    while time.time() < deadline:
+        if process.poll() is not None:
+            print(f"❌ {name} exited with code {process.returncode}")
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                if response.status != 200:
+                    return False
+                try:
+                    models = json.loads(response.read()).get("models", {})
+                except (ValueError, AttributeError):
+                    models = {}
+                # Sẵn sàng nhưng có model chưa warm được thì báo để biết đang chạy giảm cấp
+                for role, info in models.items():
+                    if info.get("state") != "ready":
+                        print(f"  ⚠️ {name}: {role} model {info.get('model')} {info.get('state')}: {info.get('error', '')}")
+                return True
+        except urllib.error.HTTPError as e:
+            # 503 = đang warm-up, in tiến độ từng bước khi có thay đổi
+            try:
+                stages = json.loads(e.read()).get("stages", {})
+                progress = ", ".join(f"{stage} {info['state']}" for stage, info in stages.items())
+            except (ValueError, AttributeError):
+                progress = f"HTTP {e.code}"
+            if progress != last:
+                print(f"  ⏳ {name}: {progress}")
+                last = progress
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+    print(f"❌ {name} not ready after {timeout}s")
+    return False
+
+
 def main():
     print("=" * 60)
     print("🎉 Year-End Party Chatbot - Deploy")
@@ -26,22 +75,39 @@ def main():
         print("  Get free token at: https://dashboard.ngrok.com/")
         print("  Or run locally: streamlit run app.py\n")
     
+    processes = []
+    env = dict(os.environ)
+    if "--in-process" not in sys.argv:
+        # Start the fortune service first: workbook, indexes, model client and a priming call
+        api_port = int(os.getenv("API_PORT", 8000))
+        print(f"\n🔮 Starting fortune service on port {api_port}...")
+        api_process = subprocess.Popen([sys.executable, "api.py"], env=env)
+        processes.append(api_process)
+        if not wait_until_ready(f"http://127.0.0.1:{api_port}/ready", api_process, "Fortune service"):
+            api_process.terminate()
+            return
+        print("✓ Fortune service warmed up")
+        env["FORTUNE_API_URL"] = f"http://127.0.0.1:{api_port}"
+
     # Start Streamlit
     print("\n🚀 Starting Streamlit...")
     streamlit_process = subprocess.Popen(
-        [sys.executable, "-m", "streamlit", "run", "app_streamlit.py"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
+        [sys.executable, "-m", "streamlit", "run", "app_streamlit.py",
+         "--server.headless", "true", "--server.port", str(STREAMLIT_PORT)],
+        env=env,
     )
-    
-    time.sleep(5)  # Wait for Streamlit to start
+    processes.append(streamlit_process)
+    if not wait_until_ready(f"http://127.0.0.1:{STREAMLIT_PORT}/_stcore/health", streamlit_process, "Streamlit"):
+        for process in processes:
+            process.terminate()
+        return
     print("✓ Streamlit started")
     
     # Create ngrok tunnel
     if auth_token:
         print("\n🌐 Creating public URL with ngrok...")
         try:
-            tunnel = ngrok.connect(8501, bind_tls=True)
+            tunnel = ngrok.connect(STREAMLIT_PORT, bind_tls=True)
             public_url = tunnel.public_url
             
             print("\n" + "=" * 60)
@@ -68,7 +134,8 @@ def main():
             time.sleep(1)
     except KeyboardInterrupt:
         print("\n\n🛑 Stopping...")
-        streamlit_process.terminate()
+        for process in processes:
+            process.terminate()
         if auth_token:
             ngrok.kill()
         print("✓ Stopped. Goodbye!")
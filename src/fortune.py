@@ -0,0 +1,206 @@
+"""
+Fortune prompt and generation shared by the Streamlit app and the offline batch job.
+"""
+import json
+import os
+from functools import lru_cache
+
+# Đổi số này mỗi khi sửa nội dung prompt để các câu bói đã lưu không bị dùng lại
+PROMPT_VERSION = "2026.2"
+
+# In toàn bộ prompt ra stdout (vài KB mỗi lượt), chỉ bật khi cần debug
+LOG_FULL_PROMPT = os.getenv("LOG_FULL_PROMPT", "0") == "1"
+
+
+def create_model(model_name, api_key):
+    """Gemini chat model with the party settings"""
+    # Import ở đây: langchain_google_genai nạp rất lâu, lượt bói có câu cố định không cần tới
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model_name,
+        api_key=api_key,
+        temperature=1.0,
+        max_output_tokens=2000,
+        # thinking_level="minimal",
+        # thinking_budget=0,
+        # include_thoughts=False,
+    )
+
+
+SYSTEM_PROMPT = """Bạn là một chatbot bói toán hài hước, thông minh, nói chuyện lưu loát dùng để giải trí trong buổi tiệc tất niên của công ty.
+Bạn sẽ dựa vào thông tin cá nhân của người dùng để đưa ra câu bói ngắn gọn, dễ hiểu, hài hước và thú vị.
+Hãy chắc chắn rằng câu bói của bạn liên quan trực tiếp đến thông tin cá nhân của người dùng.
+Hãy nhớ rằng câu bói của bạn đưa ra là cho năm 2026 (năm Bính Ngọ) nếu bạn cần tham khảo năm.
+Hãy sử dụng ngôn ngữ tự nhiên, thân thiện và gần gũi, xưng hô "Tôi" và "Bạn".
+Hãy thêm vài icon lung linh vào câu bói để tăng độ hấp dẫn, hoặc icon liên quan đến nội dung câu bói.
+Hãy tránh sử dụng các cụm từ quá trang trọng hoặc kỹ thuật.
+Hãy giữ câu bói dưới 200 từ.
+Hãy trả lời bằng {language}."""
+
+# language -> (tên ngôn ngữ trong system prompt, câu dẫn trước thông tin người dùng)
+LANGUAGES = {
+    "en": ("Tiếng Anh", "Vì đây là người Nhật, hãy trả lời bằng tiếng Anh một cách tự nhiên và thân thiện dựa vào thông tin của họ:"),
+    "vi": ("Tiếng Việt", "Đây là thông tin cá nhân của người dùng:"),
+}
+
+
+# Câu bói dự phòng khi Gemini lỗi/quá tải, không có câu nào đã sinh sẵn cho người này
+FALLBACK_FORTUNES = {
+    "vi": [
+        "✨ Thầy bói đang bận xem quẻ cho cả công ty, nhưng quẻ của {name} đã hiện rõ: năm Bính Ngọ 2026 phi nước đại như ngựa, việc gì cũng về đích sớm! 🐎🍀",
+        "🔮 Sao chiếu mệnh của {name} năm 2026 sáng tới mức làm nhiễu cả quả cầu pha lê: sức khỏe dồi dào, đồng nghiệp quý mến, thưởng Tết rủng rỉnh! 💰🎉",
+        "🌟 Quả cầu pha lê hơi lag, nhưng thầy vẫn kịp thấy {name} năm 2026: ít họp, ít bug, nhiều niềm vui và một chuyến du lịch thật đã! ✈️😄",
+    ],
+    "en": [
+        "✨ The crystal ball is busy reading the whole company, but {name}'s fortune is clear: 2026, the Year of the Horse, gallops in with quick wins and happy deadlines! 🐎🍀",
+        "🔮 {name}'s lucky star shines so bright in 2026 it made the crystal ball flicker: great health, great teammates and a generous year-end bonus! 💰🎉",
+        "🌟 The crystal ball lagged a little, yet it still showed {name}'s 2026: fewer meetings, fewer bugs, more laughs and a well-earned holiday! ✈️😄",
+    ],
+}
+
+
+def fallback_fortune(user_data):
+    """Canned fortune for when the model can't be reached, stable per guest"""
+    fortunes = FALLBACK_FORTUNES[prompt_language(user_data)]
+    name = str(user_data.get('name') or "bạn")
+    return fortunes[sum(map(ord, name)) % len(fortunes)].format(name=name)
+
+
+def prompt_language(user_data):
+    """'en' for Japanese guests, 'vi' for everyone else"""
+    return "en" if user_data['nationality'] == 'JP' else "vi"
+
+
+@lru_cache(maxsize=None)
+def system_prompt(language, version=PROMPT_VERSION):
+    """System prompt for one language, formatted once per prompt version"""
+    return SYSTEM_PROMPT.format(language=LANGUAGES[language][0])
+
+
+def build_prefix(language, company_context, role_definition):
+    """(system prompt, text parts) shared by every guest of one language.
+    Byte-identical between requests so it can be cached by the provider."""
+    parts = [
+        "Hãy sử dụng bối cảnh công ty sau đây để hiểu về văn hóa và môi trường làm việc của công ty: ",
+        company_context,
+        "Hãy sử dụng định nghĩa vai trò sau đây để hiểu về các vị trí công việc trong công ty: ",
+        role_definition,
+        LANGUAGES[language][1],
+    ]
+    return system_prompt(language), parts
+
+
+@lru_cache(maxsize=32)
+def _compiled_prefix(language, company_context, role_definition):
+    """(SystemMessage, content parts) for a prefix; reused until the context changes"""
+    from langchain_core.messages import SystemMessage
+
+    system, parts = build_prefix(language, company_context, role_definition)
+    return SystemMessage(content=system), tuple(_text_parts(parts))
+
+
+def build_tail(user_data, text_to_inject=None, fortune_number=None, payload=None):
+    """Text parts specific to one guest and one draw; payload is the pre-serialized user_data"""
+    if text_to_inject:
+        text_to_inject = f"\nHãy đảm bảo câu bói của bạn có chứa thông tin sau đây: {text_to_inject}"
+    else:
+        text_to_inject = ""
+
+    # Build fortune prompt based on whether fortune_number is provided
+    if fortune_number and fortune_number.strip():
+        fortune_prompt = f"\nNgười chơi này vừa gieo quẻ trúng số {fortune_number}, hãy kết hợp với thông tin được cho trước, Hãy tạo một câu bói vui nhộn và may mắn cho người này!"
+    else:
+        fortune_prompt = "\nHãy tạo một câu bói vui nhộn và may mắn cho người này!"
+
+    if payload is None:
+        payload = json.dumps(user_data, ensure_ascii=False)
+    return [payload, text_to_inject, fortune_prompt]
+
+
+def _text_parts(texts):
+    return [{"type": "text", "text": text} for text in texts]
+
+
+def build_prompt(user_data, company_context, role_definition, text_to_inject=None, fortune_number=None, payload=None):
+    """Chat messages for one fortune"""
+    from langchain_core.messages import HumanMessage
+
+    system, prefix = _compiled_prefix(prompt_language(user_data), company_context, role_definition)
+    tail = _text_parts(build_tail(user_data, text_to_inject, fortune_number, payload))
+    return [system, HumanMessage(content=[*prefix, *tail])]
+
+
+def build_cached_prompt(user_data, text_to_inject=None, fortune_number=None, payload=None):
+    """Messages to send when the prefix is already in a provider-side context cache"""
+    from langchain_core.messages import HumanMessage
+
+    return [HumanMessage(content=_text_parts(build_tail(user_data, text_to_inject, fortune_number, payload)))]
+
+
+def _prepare(user_data, company_context, role_definition, text_to_inject, fortune_number, context_cache, payload=None):
+    """(messages, extra model kwargs), using the context cache when one is available"""
+    messages, kwargs = None, {}
+    if context_cache is not None:
+        cached_content = context_cache.cached_content(prompt_language(user_data), company_context, role_definition)
+        if cached_content:
+            messages = build_cached_prompt(user_data, text_to_inject, fortune_number, payload)
+            kwargs = {"cached_content": cached_content}
+    if messages is None:
+        messages = build_prompt(user_data, company_context, role_definition, text_to_inject, fortune_number, payload)
+    if LOG_FULL_PROMPT:
+        print(messages)
+    return messages, kwargs
+
+
+def generate_response(user_data, model, company_context, role_definition, text_to_inject=None, fortune_number=None,
+                      context_cache=None, payload=None):
+    messages, kwargs = _prepare(user_data, company_context, role_definition, text_to_inject, fortune_number,
+                                context_cache, payload)
+    response = model.invoke(messages, **kwargs)
+    # print(response)
+    return response
+
+
+def stream_response(user_data, model, company_context, role_definition, text_to_inject=None, fortune_number=None,
+                    context_cache=None, payload=None):
+    """Like generate_response but yields text as the model produces it"""
+    messages, kwargs = _prepare(user_data, company_context, role_definition, text_to_inject, fortune_number,
+                                context_cache, payload)
+    return ResponseStream(model.stream(messages, **kwargs))
+
+
+class ResponseStream:
+    """Iterate over text pieces as they arrive; after iteration .text holds the
+    full reply and .message the merged chunk with usage_metadata"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.message = None
+        self.text = ""
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            self.message = chunk if self.message is None else self.message + chunk
+            piece = response_text(chunk)
+            if piece:
+                self.text += piece
+                yield piece
+
+    @property
+    def usage_metadata(self):
+        return getattr(self.message, 'usage_metadata', None)
+
+    def close(self):
+        """Stop the model stream early (e.g. the hedged request that lost)"""
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def response_text(response):
+    """Plain text of a model reply (Gemini 3 returns a list of content parts)"""
+    content = response.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get('text', '') if isinstance(part, dict) else str(part) for part in content)
@@ -0,0 +1,112 @@
+"""
+Persistent cache of generated fortunes: a small in-memory LRU in front of SQLite.
+Survives Streamlit restarts; entries expire after a TTL and the oldest are evicted past a size limit.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from fortune_store import normalize_fortune_number
+
+DEFAULT_CACHE_PATH = "data/fortune_cache.db"
+
+
+def cache_key(user_data, prompt_version, model_name, fortune_number=None, text_to_inject=None):
+    """Hash of everything that changes the generated fortune"""
+    payload = json.dumps(
+        [user_data, prompt_version, model_name, normalize_fortune_number(fortune_number), text_to_inject],
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class FortuneCache:
+    """get/put by cache_key(); ttl in seconds (None = never expires)"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=5000, ttl=None, memory_entries=256):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fortune_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fortune_cache_accessed ON fortune_cache (accessed_at)")
+        self._conn.commit()
+
+    def _remember(self, key, response, expires_at):
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Cached fortune text or None"""
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                response, expires_at = self._memory[key]
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    return response
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM fortune_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM fortune_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            # Hits served from memory don't touch accessed_at; good enough for eviction order
+            self._conn.execute("UPDATE fortune_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._remember(key, response, expires_at)
+            return response
+
+    def put(self, key, response):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fortune_cache VALUES (?, ?, ?, ?)",
+                (key, response, expires_at, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+            self._remember(key, response, expires_at)
+
+    def _evict(self, now):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        self._conn.execute("DELETE FROM fortune_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        count = self._conn.execute("SELECT COUNT(*) FROM fortune_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM fortune_cache WHERE key IN "
+                "(SELECT key FROM fortune_cache ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fortune_cache").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM fortune_cache")
+            self._conn.commit()
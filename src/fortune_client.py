@@ -0,0 +1,101 @@
+"""
+What the Streamlit apps talk to: the fortune service over HTTP when
+FORTUNE_API_URL is set, otherwise the same pipeline in-process.
+Both clients yield the (event, payload) pairs described in fortune_service.py.
+"""
+import json
+from urllib.parse import quote
+
+from workbook import FetchResult
+
+
+class FortuneServiceError(RuntimeError):
+    """The remote service failed while handling a request"""
+
+
+class LocalFortuneClient:
+    """Runs the pipeline inside the Streamlit process"""
+
+    def __init__(self, service):
+        self.service = service
+
+    def participant(self, query):
+        return self.service.participant(query)
+
+    def stream(self, query, fortune_number=None, timings=None):
+        return self.service.stream(query, fortune_number, timings)
+
+    def fortune(self, query, fortune_number=None):
+        return self.service.fortune(query, fortune_number)
+
+    def reload(self, force=False):
+        return self.service.reload(force)
+
+    def ready(self):
+        return self.service.ready()
+
+    def queue(self):
+        return self.service.queue()
+
+
+class HttpFortuneClient:
+    """Talks to api.py; generation happens in the service's workers"""
+
+    def __init__(self, base_url, timeout=120):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def participant(self, query):
+        response = self.session.get(f"{self.base_url}/participants/{quote(str(query), safe='')}", timeout=self.timeout)
+        if response.status_code == 404:
+            return {"participant": None, "candidates": []}
+        response.raise_for_status()
+        return response.json()
+
+    def stream(self, query, fortune_number=None, timings=None):
+        # timings chỉ đo được phía service, xem /metrics của api.py
+        with self.session.post(f"{self.base_url}/fortune/stream", json={"query": query, "fortune_number": fortune_number},
+                               stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                message = json.loads(line)
+                if message["event"] == "error":
+                    raise FortuneServiceError(message["data"]["message"])
+                yield message["event"], message["data"]
+
+    def fortune(self, query, fortune_number=None):
+        response = self.session.post(f"{self.base_url}/fortune", json={"query": query, "fortune_number": fortune_number},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def reload(self, force=False):
+        response = self.session.post(f"{self.base_url}/admin/reload", params={"force": str(force).lower()}, timeout=self.timeout)
+        response.raise_for_status()
+        return FetchResult(**response.json())
+
+    def ready(self):
+        # 503 khi service còn đang warm-up, nội dung vẫn là trạng thái từng bước
+        response = self.session.get(f"{self.base_url}/ready", timeout=self.timeout)
+        if response.status_code not in (200, 503):
+            response.raise_for_status()
+        return response.json()
+
+    def queue(self):
+        response = self.session.get(f"{self.base_url}/queue", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+def make_client(get_setting, **service_options):
+    """HttpFortuneClient if FORTUNE_API_URL is set, else an in-process LocalFortuneClient"""
+    api_url = get_setting("FORTUNE_API_URL")
+    if api_url:
+        print(f"Using fortune service at {api_url}")
+        return HttpFortuneClient(api_url, timeout=float(get_setting("FORTUNE_API_TIMEOUT", 120)))
+    from fortune_service import FortuneService
+    return LocalFortuneClient(FortuneService.from_settings(get_setting, **service_options))
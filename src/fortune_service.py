@@ -0,0 +1,354 @@
+"""
+The fortune pipeline without any UI: participant lookup, then the fixed response,
+the pre-generated store, the fortune cache, or a streamed Gemini call.
+
+Used in-process by the Streamlit apps (fortune_client.LocalFortuneClient) and
+behind the HTTP service (api.py). stream() yields (event, payload) pairs:
+
+    ("participant", {"key", "data"})      guest found
+    ("candidates", [{"key", "name", "team"}])  several names match, nothing generated
+    ("not_found", {"query"})
+    ("queued", {"ticket", "position", "eta_seconds"})  waiting for a free Gemini slot,
+                                           repeated about once a second
+    ("delta", text)                        next piece of a generated fortune
+    ("done", {"response", "source"})       source: fixed / store / cache / llm / coalesced /
+                                           partial (deadline hit mid-reply) /
+                                           fallback_store / fallback_generic (model unavailable or empty reply)
+
+Every request has an end-to-end deadline (FORTUNE_DEADLINE_SECONDS). With
+AI_FALLBACK_MODEL set, a generation whose first token is later than the primary
+model's usual p95 (HEDGE_PERCENTILE) is also sent to the fallback model and the
+first one to answer wins, see hedging.py.
+
+New generations take a ticket from the scheduler (QUEUE_MAX_CONCURRENCY,
+LLM_RATE_PER_MINUTE) and wait in priority + FIFO order, see scheduler.py;
+requests that join a generation already in flight don't queue.
+"""
+import time
+from collections import namedtuple
+
+from context_cache import GeminiContextCacheProvider, PromptPrefixCache
+from context_retrieval import DEFAULT_TOKEN_BUDGET
+import fortune
+from fortune import PROMPT_VERSION, create_model, fallback_fortune, stream_response
+from fortune_cache import DEFAULT_CACHE_PATH, FortuneCache, cache_key
+from fortune_store import DEFAULT_STORE_PATH, FortuneStore, row_hash
+from hedging import Deadline, DeadlineExceeded, HedgedStream, TtftTracker
+from llm import AsyncLLM, LazyModel
+from metrics import METRICS
+from resilience import CircuitBreaker, CircuitOpenError, ResilientLLM
+from scheduler import FortuneScheduler
+from single_flight import SingleFlight
+from snapshot import SnapshotRefresher
+from usage_store import DEFAULT_EVENT, DEFAULT_USAGE_PATH, UsageStore
+from warmup import Warmup
+from workbook import LOCAL_WORKBOOK, LocalWorkbook, SharePointWorkbook
+
+# record: the ParticipantRecord (None if not found); candidates: fuzzy matches when ambiguous
+Lookup = namedtuple("Lookup", "record candidates snapshot")
+
+
+def _candidate(record):
+    return {"key": record.key, "name": record.data.get('name'), "team": record.data.get('team')}
+
+
+class FortuneService:
+    """Lookup + generation for one process; safe to share between threads"""
+
+    def __init__(self, refresher, model, model_name, context_cache=None, store=None, cache=None,
+                 usage=None, metrics=METRICS, usage_source="service", fallback_model=None,
+                 fallback_model_name=None, ttft_tracker=None, deadline_seconds=None, scheduler=None):
+        self.refresher = refresher
+        self.model = model
+        self.model_name = model_name
+        self.context_cache = context_cache
+        self.store = store
+        self.cache = cache
+        self.usage = usage
+        self.metrics = metrics
+        self.usage_source = usage_source
+        self.fallback_model = fallback_model
+        self.fallback_model_name = fallback_model_name
+        self.ttft_tracker = ttft_tracker or TtftTracker()
+        self.deadline_seconds = deadline_seconds
+        self.scheduler = scheduler
+        self.flights = SingleFlight()
+        self.warmup = Warmup()
+
+    @classmethod
+    def from_settings(cls, get_setting, use_sharepoint=None, usage_source="service", workers=1):
+        """Build everything from a getter like os.getenv or get_secret; workers is the number of
+        processes sharing the Gemini quota, each gets its share of the queue limits"""
+        if use_sharepoint is None:
+            use_sharepoint = get_setting("WORKBOOK_SOURCE", "local") == "sharepoint"
+        source = SharePointWorkbook.from_settings(get_setting) if use_sharepoint else LocalWorkbook(LOCAL_WORKBOOK)
+        refresher = SnapshotRefresher(source, interval=float(get_setting("WORKBOOK_REFRESH_SECONDS", 60)),
+                                      context_token_budget=int(get_setting("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))).start()
+
+        model_name, api_key = get_setting("AI_MODEL"), get_setting("GEMINI_API_KEY")
+        context_cache = None
+        if str(get_setting("GEMINI_CONTEXT_CACHE", "1")) == "1":
+            context_cache = PromptPrefixCache(GeminiContextCacheProvider(api_key), model_name)
+            # Workbook nạp lại với nội dung khác: xóa ngay cache của prefix cũ trên Gemini
+            refresher.listeners.append(
+                lambda snapshot: context_cache.invalidate(snapshot.company_context, snapshot.role_definition))
+        ttl = get_setting("FORTUNE_CACHE_TTL")
+        METRICS.log_path = get_setting("METRICS_LOG_PATH", METRICS.log_path)
+        fortune.LOG_FULL_PROMPT = str(get_setting("LOG_FULL_PROMPT", "0")) == "1"
+
+        max_concurrency = int(get_setting("LLM_MAX_CONCURRENCY", 8))
+        rate = get_setting("LLM_RATE_PER_MINUTE")
+        # Mỗi worker một scheduler riêng: chia hạn mức để tổng không vượt quota của API
+        scheduler = FortuneScheduler(max(1, int(get_setting("QUEUE_MAX_CONCURRENCY", max_concurrency)) // workers),
+                                     rate_per_minute=float(rate) / workers if rate else None,
+                                     default_service_seconds=float(get_setting("QUEUE_SERVICE_SECONDS", 6)))
+
+        def resilient(name, retries):
+            return ResilientLLM(
+                AsyncLLM(LazyModel(lambda: create_model(name, api_key)),
+                         max_concurrency=max_concurrency),
+                retries=retries,
+                breaker=CircuitBreaker(int(get_setting("LLM_BREAKER_FAILURES", 5)),
+                                       float(get_setting("LLM_BREAKER_RESET_SECONDS", 30))),
+                on_rate_limited=scheduler.throttle,
+            )
+
+        fallback_name = get_setting("AI_FALLBACK_MODEL")
+        deadline = get_setting("FORTUNE_DEADLINE_SECONDS", 25)
+        service = cls(
+            refresher,
+            resilient(model_name, int(get_setting("LLM_RETRIES", 3))),
+            model_name,
+            context_cache=context_cache,
+            store=FortuneStore(get_setting("FORTUNE_STORE_PATH", DEFAULT_STORE_PATH)),
+            cache=FortuneCache(get_setting("FORTUNE_CACHE_PATH", DEFAULT_CACHE_PATH),
+                               max_entries=int(get_setting("FORTUNE_CACHE_MAX_ENTRIES", 5000)),
+                               ttl=float(ttl) if ttl else None),
+            usage=UsageStore(get_setting("USAGE_STORE_PATH", DEFAULT_USAGE_PATH), get_setting("EVENT_NAME", DEFAULT_EVENT)),
+            usage_source=usage_source,
+            # Model dự phòng chỉ là đường vòng khi model chính chậm, không cần thử lại nhiều
+            fallback_model=resilient(fallback_name, 1) if fallback_name else None,
+            fallback_model_name=fallback_name,
+            ttft_tracker=TtftTracker(percentile=float(get_setting("HEDGE_PERCENTILE", 0.95)),
+                                     default=float(get_setting("HEDGE_AFTER_SECONDS", 4)),
+                                     minimum=float(get_setting("HEDGE_MIN_SECONDS", 0.5))),
+            deadline_seconds=float(deadline) if deadline else None,
+            scheduler=scheduler,
+        )
+        # Nạp workbook, dựng model, mở kết nối ngay khi khởi động thay vì đợi khách đầu tiên
+        service.warmup.start(service, prime_model=str(get_setting("WARMUP_PRIME_MODEL", "1")) == "1")
+        return service
+
+    def lookup(self, query):
+        """Exact ID / name first, then accent-insensitive fuzzy search on names"""
+        # Giữ nguyên snapshot này cho đến hết request
+        snapshot = self.refresher.current()
+        query = query.strip() if isinstance(query, str) else query
+        record = snapshot.index.get(query)
+        candidates = []
+        if record is None and isinstance(query, str) and not query.isdigit():
+            # Không khớp chính xác thì tìm gần đúng (không dấu, một phần tên, gõ sai)
+            candidates = snapshot.index.search(query, k=5)
+            if len(candidates) == 1:
+                record, candidates = candidates[0], []
+        return Lookup(record, candidates, snapshot)
+
+    def participant(self, query):
+        """{"participant": {key, data} or None, "candidates": [...]}"""
+        found = self.lookup(query)
+        return {
+            "participant": {"key": found.record.key, "data": dict(found.record.data)} if found.record else None,
+            "candidates": [_candidate(c) for c in found.candidates],
+        }
+
+    def ready(self):
+        """Warm-up progress, see warmup.Warmup.status"""
+        return self.warmup.status()
+
+    def queue(self):
+        """Scheduler status, see scheduler.FortuneScheduler.status"""
+        return self.scheduler.status() if self.scheduler is not None else None
+
+    def reload(self, force=False):
+        """Check the workbook source right away; returns the FetchResult"""
+        return self.refresher.refresh_now(force)
+
+    def stream(self, query, fortune_number=None, timings=None, deadline=None):
+        """Yield (event, payload) pairs for one fortune request, see the module docstring"""
+        own_timings = timings is None
+        if own_timings:
+            timings = self.metrics.start()
+        if deadline is None:
+            deadline = Deadline(self.deadline_seconds)
+        try:
+            yield from self._stream(query, fortune_number, timings, deadline)
+        finally:
+            if own_timings:
+                self.metrics.finish(timings)
+
+    def _stream(self, query, fortune_number, timings, deadline):
+        with timings.stage("participant_lookup"):
+            found = self.lookup(query)
+        if found.record is None:
+            timings.labels["source"] = "candidates" if found.candidates else "not_found"
+            if found.candidates:
+                yield "candidates", [_candidate(c) for c in found.candidates]
+            else:
+                yield "not_found", {"query": query}
+            return
+
+        record, snapshot = found.record, found.snapshot
+        user_data = dict(record.data)
+        yield "participant", {"key": record.key, "data": user_data}
+
+        if record.fixed_response is not None and str(record.fixed_response).strip() != "":
+            timings.labels["source"] = "fixed"
+            yield "done", {"response": record.fixed_response, "source": "fixed"}
+            return
+
+        stored = None
+        if self.store is not None:
+            stored = self.store.get(record.key, fortune_number, row_hash(user_data, record.text_to_inject), PROMPT_VERSION)
+        if stored is not None:
+            timings.labels["source"] = "store"
+            yield "done", {"response": stored, "source": "store"}
+            return
+
+        key = cache_key(user_data, PROMPT_VERSION, self.model_name, fortune_number, record.text_to_inject)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            timings.labels["source"] = "cache"
+            yield "done", {"response": cached, "source": "cache"}
+            return
+
+        yield from self._generate(record, snapshot, user_data, key, fortune_number, timings, deadline)
+
+    def _wait_turn(self, ticket, deadline, timings):
+        """Yield "queued" events until the ticket is admitted; False if the deadline passed first"""
+        start = time.perf_counter()
+        timeout = 0
+        try:
+            while not ticket.wait(timeout):
+                if deadline.expired:
+                    return False
+                yield "queued", ticket.info()
+                remaining = deadline.remaining()
+                timeout = 1.0 if remaining is None else min(1.0, remaining)
+            return True
+        finally:
+            timings.record("queue_wait", time.perf_counter() - start)
+
+    def _generate(self, record, snapshot, user_data, key, fortune_number, timings, deadline):
+        clock = {"start": time.perf_counter()}
+        ticket, ok = None, False
+
+        def start_generation():
+            # Người đi chung có thể kéo lượt gọi trước khi vé của người mở được vào: chờ cùng vé đó
+            if ticket is not None and not ticket.wait(deadline.remaining()):
+                raise DeadlineExceeded("Fortune deadline passed in the queue")
+            # model.stream chỉ chạy khi lặp, nên bước này chỉ là dựng prompt
+            with timings.stage("prompt_build"):
+                company_context, role_definition, context_cache = self.prompt_context(snapshot, user_data)
+                primary = stream_response(user_data, self.model, company_context, role_definition,
+                                          record.text_to_inject, fortune_number, context_cache=context_cache,
+                                          payload=record.payload)
+
+            # Context cache gắn với model chính, model dự phòng nhận prompt đầy đủ
+            def fallback():
+                return stream_response(user_data, self.fallback_model, company_context, role_definition,
+                                       record.text_to_inject, fortune_number, payload=record.payload)
+
+            start_fallback = fallback if self.fallback_model is not None else None
+            clock["start"] = time.perf_counter()
+            return HedgedStream(lambda: primary, start_fallback, tracker=self.ttft_tracker, deadline=deadline,
+                                on_attempt=record_attempt)
+
+        def record_attempt(name, stream, outcome, error):
+            # Mọi lượt gọi đều ghi lại, kể cả bên thua, bị cắt giữa chừng hay lỗi
+            if self.usage is None or isinstance(error, CircuitOpenError):
+                return
+            model_name = self.fallback_model_name if name == "fallback" else self.model_name
+            source = self.usage_source if outcome == "complete" else f"{self.usage_source}:{outcome}"
+            self.usage.record(model_name, getattr(stream, "usage_metadata", None), source=source)
+
+        def finish_generation(stream, text):
+            timings.labels["model"] = self.fallback_model_name if stream.winner == "fallback" else self.model_name
+            # Câu trả lời rỗng (bị chặn an toàn, hết token vì suy nghĩ) không được lưu;
+            # key gắn với model chính nên câu của model dự phòng cũng không lưu
+            if self.cache is not None and text.strip() and stream.winner != "fallback":
+                self.cache.put(key, text)
+
+        # Cùng key đang được sinh dở thì đi chung lượt gọi LLM đó
+        shared, leader = self.flights.join(key, start_generation, finish_generation)
+        source = "llm" if leader else "coalesced"
+        timings.labels["source"] = source
+        # Chỉ người mở lượt gọi mới lấy vé, người đi chung không xếp hàng
+        if leader and self.scheduler is not None:
+            ticket = self.scheduler.submit(record.priority)
+        first = True
+        try:
+            if ticket is not None and not (yield from self._wait_turn(ticket, deadline, timings)):
+                print(f"Fortune deadline passed in the queue (ticket {ticket.number})")
+                timings.labels["source"] = "queue_timeout"
+                yield "done", self._fallback(record, user_data)
+                return
+            for piece in shared:
+                if first:
+                    timings.record("llm_ttft", time.perf_counter() - clock["start"])
+                    first = False
+                yield "delta", piece
+            ok = bool(shared.text.strip())
+        except DeadlineExceeded:
+            print(f"Fortune deadline passed after {len(shared.text)} characters")
+            timings.labels["source"] = "deadline"
+            if shared.text.strip():
+                # Khách đã thấy phần đầu câu bói, giữ lại thay vì đổi sang câu khác
+                yield "done", {"response": shared.text.rstrip() + "…", "source": "partial"}
+            else:
+                yield "done", self._fallback(record, user_data)
+            return
+        except Exception as e:
+            # Hết lượt thử lại hoặc cầu dao đang ngắt: trả câu dự phòng ngay thay vì để khách chờ
+            print(f"Fortune generation failed, using fallback: {e}")
+            timings.labels["source"] = "fallback"
+            yield "done", self._fallback(record, user_data)
+            return
+        finally:
+            # Người cuối cùng rời đi thì dừng luôn lượt gọi LLM chưa xong
+            shared.close()
+            # Khách bỏ đi giữa chừng cũng trả lại chỗ trong hàng / slot
+            if ticket is not None:
+                ticket.release(ok)
+        timings.record("llm_total", time.perf_counter() - clock["start"])
+        if not shared.text.strip():
+            print("Fortune generation returned an empty reply, using fallback")
+            timings.labels["source"] = "fallback"
+            yield "done", self._fallback(record, user_data)
+            return
+        yield "done", {"response": shared.text, "source": source}
+
+    def prompt_context(self, snapshot, user_data):
+        """(company_context, role_definition, context_cache) for this guest's prompt"""
+        if snapshot.context is None or snapshot.context.fits:
+            return snapshot.company_context, snapshot.role_definition, self.context_cache
+        # Ngữ cảnh đã lọc khác nhau theo từng người nên không dùng chung context cache được
+        return (*snapshot.context.select(user_data), None)
+
+    def _fallback(self, record, user_data):
+        """An older stored fortune for this guest, else a canned one"""
+        stored = self.store.latest(record.key) if self.store is not None else None
+        if stored is not None:
+            return {"response": stored, "source": "fallback_store"}
+        return {"response": fallback_fortune(user_data), "source": "fallback_generic"}
+
+    def fortune(self, query, fortune_number=None):
+        """Whole request at once: {"participant", "candidates", "response", "source"}"""
+        result = {"participant": None, "candidates": [], "response": None, "source": None}
+        for event, payload in self.stream(query, fortune_number):
+            if event == "participant":
+                result["participant"] = payload
+            elif event == "candidates":
+                result["candidates"] = payload
+            elif event == "done":
+                result.update(payload)
+        return result
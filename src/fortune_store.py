@@ -0,0 +1,81 @@
+"""
+SQLite store of pre-generated fortunes.
+Filled ahead of the event by pregenerate.py and read first by the Streamlit app.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_STORE_PATH = "data/fortunes.db"
+
+
+def row_hash(user_data, text_to_inject=None):
+    """Hash of the participant row, so edits in the workbook invalidate stored fortunes"""
+    payload = json.dumps([user_data, text_to_inject], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_fortune_number(fortune_number):
+    """'' when no number was drawn, else the stripped number"""
+    return (fortune_number or "").strip()
+
+
+class FortuneStore:
+    """Pre-generated fortunes keyed by (participant key, fortune number)"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fortunes (
+                participant_key TEXT NOT NULL,
+                fortune_number TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                model TEXT,
+                row_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (participant_key, fortune_number)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, participant_key, fortune_number, row_hash, prompt_version):
+        """Stored fortune text, or None if missing or generated from an older row/prompt"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM fortunes WHERE participant_key = ? AND fortune_number = ?"
+                " AND row_hash = ? AND prompt_version = ?",
+                (str(participant_key), normalize_fortune_number(fortune_number), row_hash, prompt_version),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, participant_key, fortune_number, row_hash, prompt_version, model, response):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fortunes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(participant_key), normalize_fortune_number(fortune_number), prompt_version,
+                 model, row_hash, response, time.time()),
+            )
+            self._conn.commit()
+
+    def latest(self, participant_key):
+        """Most recent fortune for a guest whatever its number, row or prompt version (fallback use)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM fortunes WHERE participant_key = ? ORDER BY created_at DESC LIMIT 1",
+                (str(participant_key),),
+            ).fetchone()
+        return row[0] if row else None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fortunes").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,191 @@
+"""
+Hedged generation with an end-to-end deadline.
+
+The primary model's stream starts right away. If it has not produced a first
+piece by the time a slow primary usually would (a percentile of its recent
+time-to-first-token), the same fortune is requested from the faster fallback
+model too, and whichever answers first wins; the other is cancelled. If nothing
+has finished by the request's deadline, DeadlineExceeded is raised so the
+caller can degrade (keep the partial text or serve a fallback fortune).
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+_END = object()
+
+
+class DeadlineExceeded(TimeoutError):
+    """The fortune request ran out of its time budget"""
+
+
+class Deadline:
+    """Absolute expiry for one request; seconds=None means no limit"""
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + seconds if seconds else None
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - self.clock())
+
+    @property
+    def expired(self):
+        return self.expires_at is not None and self.clock() >= self.expires_at
+
+
+class TtftTracker:
+    """Recent primary time-to-first-token; threshold() is when to send the hedge"""
+
+    def __init__(self, percentile=0.95, default=4.0, minimum=0.5, maximum=15.0, window=200, min_samples=20):
+        self.percentile = percentile
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def threshold(self):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default
+            ordered = sorted(self._samples)
+        value = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+        return min(self.maximum, max(self.minimum, value))
+
+
+class HedgedStream:
+    """Text pieces from the primary stream, or from the fallback if that answers first.
+
+    start_primary / start_fallback are zero-argument callables returning an iterable of
+    text pieces (e.g. fortune.ResponseStream); start_fallback may be None (deadline only).
+    on_attempt(name, stream, outcome, error) is called once for every stream that was
+    started, winner or not: outcome is "complete", "cancelled" (lost the race, deadline,
+    guest left) or "failed".
+    """
+
+    def __init__(self, start_primary, start_fallback=None, tracker=None, deadline=None, hedge_after=None,
+                 on_attempt=None):
+        self._starters = {"primary": start_primary, "fallback": start_fallback}
+        self.tracker = tracker
+        self.deadline = deadline or Deadline(None)
+        self.hedge_after = hedge_after
+        self.on_attempt = on_attempt
+        self.winner = None
+        self.hedged = False
+        self._streams = {}
+        self._cancel = {"primary": threading.Event(), "fallback": threading.Event()}
+        self._queue = queue.Queue()
+
+    @property
+    def usage_metadata(self):
+        return getattr(self._streams.get(self.winner), "usage_metadata", None)
+
+    def _start(self, name):
+        started = time.monotonic()
+        threading.Thread(target=self._pump, args=(name, started), name=f"hedge-{name}", daemon=True).start()
+
+    def _pump(self, name, started):
+        stream = iterator = error = None
+        outcome = "failed"
+        first = True
+        try:
+            stream = self._starters[name]()
+            self._streams[name] = stream
+            iterator = iter(stream)
+            for piece in iterator:
+                if first:
+                    first = False
+                    if name == "primary" and self.tracker is not None:
+                        # Ghi cả khi model chính thua, để ngưỡng hedge không bị lệch thấp
+                        self.tracker.observe(time.monotonic() - started)
+                if self._cancel[name].is_set():
+                    outcome = "cancelled"
+                    return
+                self._queue.put((name, piece))
+            outcome = "complete"
+            self._queue.put((name, _END))
+        except Exception as e:
+            error = e
+            self._queue.put((name, e))
+        finally:
+            if self._cancel[name].is_set():
+                # Đóng cả stream bên trong: lượt gọi bị hủy không tính là thành công hay lỗi
+                for obj in (iterator, stream):
+                    close = getattr(obj, "close", None)
+                    if close is not None:
+                        close()
+            if self.on_attempt is not None and stream is not None:
+                try:
+                    self.on_attempt(name, stream, outcome, error)
+                except Exception as e:
+                    print(f"Recording the {name} attempt failed: {e}")
+
+    def _hedge_delay(self):
+        if self.hedge_after is not None:
+            return self.hedge_after
+        return self.tracker.threshold() if self.tracker is not None else None
+
+    def _cancel_all(self, keep=None):
+        for name, event in self._cancel.items():
+            if name != keep:
+                event.set()
+
+    def _send_hedge(self, running, started):
+        self.hedged = True
+        running.add("fallback")
+        print(f"No first token after {time.monotonic() - started:.1f}s, sending hedged request to the fallback model")
+        self._start("fallback")
+
+    def __iter__(self):
+        can_hedge = self._starters["fallback"] is not None
+        hedge_delay = self._hedge_delay() if can_hedge else None
+        started = time.monotonic()
+        running = {"primary"}
+        self._start("primary")
+        try:
+            while True:
+                timeout = self.deadline.remaining()
+                if self.winner is None and can_hedge and not self.hedged and hedge_delay is not None:
+                    until_hedge = max(0.0, started + hedge_delay - time.monotonic())
+                    timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+                try:
+                    name, item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    if self.deadline.expired:
+                        raise DeadlineExceeded("Fortune deadline passed")
+                    if self.winner is None and can_hedge and not self.hedged:
+                        self._send_hedge(running, started)
+                    continue
+
+                if self.winner is not None and name != self.winner:
+                    continue
+                if isinstance(item, Exception):
+                    running.discard(name)
+                    if self.winner is None and can_hedge and not self.hedged:
+                        # Model chính lỗi ngay: gọi model dự phòng luôn, không chờ
+                        self._send_hedge(running, started)
+                    if self.winner is None and running:
+                        continue
+                    raise item
+                if item is _END:
+                    if self.winner is None:
+                        self.winner = name
+                    return
+                if self.winner is None:
+                    self.winner = name
+                    self._cancel_all(keep=name)
+                    if name == "fallback":
+                        print(f"Hedged request won: fallback answered first after {time.monotonic() - started:.1f}s")
+                yield item
+        finally:
+            # Bên thua (hoặc cả hai nếu người dùng bỏ đi giữa chừng) dừng ở mẩu tiếp theo
+            self._cancel_all()
@@ -0,0 +1,104 @@
+"""
+Async Gemini layer shared by every request in the process.
+
+All LLM calls run as coroutines (ainvoke / astream) on one background event loop,
+so they share the model's async client and its keep-alive connection pool instead
+of each blocking a thread on its own connection. A process-wide semaphore caps how
+many calls are in flight; the rest wait on the loop without holding a thread.
+
+AsyncLLM also offers blocking invoke()/stream() with the same signatures as the
+langchain model, so it can be passed anywhere a model is expected. Wrap the model
+in LazyModel to defer building it (and importing its SDK) to the first call.
+"""
+import asyncio
+import queue
+import threading
+
+_DONE = object()
+
+
+class LazyModel:
+    """Builds the chat model on first use, so the LLM SDK is only imported
+    when a guest actually needs a generated fortune"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+class AsyncLLM:
+    """Wraps a langchain chat model; one instance (and one loop) per process"""
+
+    def __init__(self, model, max_concurrency=8):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-loop", daemon=True)
+        self._thread.start()
+        # Semaphore phải được tạo trong chính event loop sẽ dùng nó
+        self._semaphore = self.submit(self._make_semaphore()).result()
+
+    async def _make_semaphore(self):
+        return asyncio.Semaphore(self.max_concurrency)
+
+    def submit(self, coroutine):
+        """Run a coroutine on the LLM loop from any thread; returns a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def ainvoke(self, messages, **kwargs):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                return await self.model.ainvoke(messages, **kwargs)
+            finally:
+                self.in_flight -= 1
+
+    async def astream(self, messages, **kwargs):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                async for chunk in self.model.astream(messages, **kwargs):
+                    yield chunk
+            finally:
+                self.in_flight -= 1
+
+    def invoke(self, messages, **kwargs):
+        """Blocking call for sync code (Streamlit script thread, thread pools)"""
+        return self.submit(self.ainvoke(messages, **kwargs)).result()
+
+    def stream(self, messages, **kwargs):
+        """Blocking iterator over chunks; closing it early cancels the call"""
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in self.astream(messages, **kwargs):
+                    chunks.put((chunk, None))
+            except Exception as e:
+                chunks.put((None, e))
+            else:
+                chunks.put((_DONE, None))
+
+        future = self.submit(pump())
+        try:
+            while True:
+                chunk, error = chunks.get()
+                if error is not None:
+                    raise error
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            future.cancel()
@@ -0,0 +1,201 @@
+"""
+Per-stage latency metrics for the fortune request path.
+
+    timings = METRICS.start(source="stream")
+    with timings.stage("participant_lookup"):
+        ...
+    timings.record("llm_ttft", seconds)
+    METRICS.finish(timings)
+
+Each stage goes into an in-process histogram (p50/p95/p99 over the most recent
+samples, cumulative buckets for Prometheus), and each finished request is
+appended as one line to a JSONL log. start_metrics_server() exposes
+GET /metrics in Prometheus text format.
+"""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_LOG_PATH = "data/metrics.jsonl"
+
+
+class Histogram:
+    """Cumulative buckets plus a window of recent samples for percentiles"""
+
+    def __init__(self, buckets=BUCKETS, window=2048):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+
+    def percentile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RequestTimings:
+    """Stage durations of one request, flushed to the registry when it ends"""
+
+    def __init__(self, registry, labels):
+        self.registry = registry
+        self.labels = dict(labels)
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        # Một stage có thể chạy nhiều lần trong request (vd. render), cộng dồn lại
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+
+class Metrics:
+    """Process-wide registry of stage histograms"""
+
+    def __init__(self, log_path=DEFAULT_LOG_PATH):
+        self.log_path = log_path
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Time a single stage outside of a request (e.g. the background workbook fetch)"""
+        timings = self.start(**labels)
+        try:
+            with timings.stage(stage):
+                yield timings
+        finally:
+            self.finish(timings, total=False)
+
+    def start(self, **labels):
+        """Timings for a request that may span Streamlit reruns; call finish() at the end"""
+        return RequestTimings(self, labels)
+
+    @contextmanager
+    def request(self, **labels):
+        timings = self.start(**labels)
+        try:
+            yield timings
+        finally:
+            self.finish(timings)
+
+    def finish(self, timings, total=True):
+        if total:
+            timings.stages.setdefault("total", time.perf_counter() - timings.started)
+        for stage, seconds in timings.stages.items():
+            self.observe(stage, seconds)
+        self.log(timings)
+
+    def log(self, timings):
+        if not self.log_path:
+            return
+        line = {"ts": time.time(), **timings.labels,
+                "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in timings.stages.items()}}
+        try:
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            print(f"Could not write metrics log: {e}")
+
+    def summary(self):
+        """{stage: {count, p50, p95, p99}} in milliseconds"""
+        with self._lock:
+            result = {}
+            for stage, histogram in self._histograms.items():
+                result[stage] = {"count": histogram.count}
+                for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                    value = histogram.percentile(q)
+                    result[stage][name] = None if value is None else round(value * 1000, 2)
+            return result
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP fortune_stage_seconds Latency of each fortune request stage",
+            "# TYPE fortune_stage_seconds histogram",
+        ]
+        quantiles = []
+        with self._lock:
+            for stage in sorted(self._histograms):
+                histogram = self._histograms[stage]
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    lines.append(f'fortune_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'fortune_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'fortune_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'fortune_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+                for q in (0.5, 0.95, 0.99):
+                    value = histogram.percentile(q)
+                    if value is not None:
+                        quantiles.append(f'fortune_stage_recent_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+        if quantiles:
+            lines.append("# HELP fortune_stage_recent_seconds Percentiles over the most recent samples")
+            lines.append("# TYPE fortune_stage_recent_seconds gauge")
+            lines.extend(quantiles)
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def start_metrics_server(metrics=METRICS, port=9464, host="127.0.0.1", readiness=None):
+    """Serve GET /metrics (Prometheus text) and GET /metrics.json from a daemon thread;
+    with a readiness callable (returning a dict with "ready") also /health and /ready"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status = 200
+            if self.path == "/metrics":
+                body, content_type = metrics.prometheus_text(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(metrics.summary()), "application/json"
+            elif self.path == "/health" and readiness is not None:
+                body, content_type = json.dumps({"status": "ok"}), "application/json"
+            elif self.path == "/ready" and readiness is not None:
+                ready = readiness()
+                status = 200 if ready.get("ready") else 503
+                body, content_type = json.dumps(ready, ensure_ascii=False), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,134 @@
+"""
+Accent-insensitive fuzzy search over participant names.
+Matches typed text with or without Vietnamese diacritics, token prefixes
+(given name only, family name only) and small typos, ranked best first.
+"""
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+# Điểm cho từng kiểu khớp của một token trong câu tìm kiếm
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+TYPO_SCORE = 1.0
+ACCENT_BONUS = 1.0
+FULL_NAME_BONUS = 5.0
+
+
+def fold_accents(text):
+    """Lowercase and strip diacritics: 'Lê Minh Dương' -> 'le minh duong'"""
+    text = str(text).lower().replace("đ", "d")
+    decomposed = unicodedata.normalize("NFD", text)
+    stripped = "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+    return " ".join(stripped.split())
+
+
+def _max_typos(token):
+    """How many edits a query token of this length may be off by"""
+    if len(token) >= 8:
+        return 2
+    if len(token) >= 3:
+        return 1
+    return 0
+
+
+def _edit_distance(a, b, limit):
+    """Edit distance counting a swap of two adjacent letters as one edit,
+    or limit + 1 as soon as it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            distance = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            )
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                distance = min(distance, before_previous[j - 2] + 1)
+            current.append(distance)
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+class NameSearchIndex:
+    """Token index over folded names; search() returns the top-k records"""
+
+    def __init__(self, records, name_key="name"):
+        self._records = []
+        self._names = []
+        self._exact_tokens = []
+        self._postings = defaultdict(set)
+        self._by_length = defaultdict(list)
+        for record in records:
+            name = record.data.get(name_key)
+            if name is None:
+                continue
+            position = len(self._records)
+            self._records.append(record)
+            self._names.append(fold_accents(name))
+            self._exact_tokens.append(frozenset(str(name).lower().split()))
+            for token in self._names[-1].split():
+                self._postings[token].add(position)
+        self._vocabulary = sorted(self._postings)
+        for token in self._vocabulary:
+            self._by_length[len(token)].append(token)
+
+    def __len__(self):
+        return len(self._records)
+
+    def _token_matches(self, token):
+        """{vocabulary token: score} for one folded query token"""
+        matches = {}
+        if token in self._postings:
+            matches[token] = EXACT_SCORE
+        if len(token) >= 2:
+            start = bisect_left(self._vocabulary, token)
+            for candidate in self._vocabulary[start:]:
+                if not candidate.startswith(token):
+                    break
+                matches.setdefault(candidate, PREFIX_SCORE)
+        limit = _max_typos(token)
+        if limit:
+            for length in range(len(token) - limit, len(token) + limit + 1):
+                for candidate in self._by_length.get(length, ()):
+                    if candidate not in matches and _edit_distance(token, candidate, limit) <= limit:
+                        matches[candidate] = TYPO_SCORE
+        return matches
+
+    def search(self, query, k=5):
+        """Top-k records whose name matches every token of query"""
+        folded_query = fold_accents(query)
+        tokens = folded_query.split()
+        if not tokens:
+            return []
+
+        scores = None
+        for token in tokens:
+            token_scores = defaultdict(float)
+            for candidate, score in self._token_matches(token).items():
+                for position in self._postings[candidate]:
+                    token_scores[position] = max(token_scores[position], score)
+            if scores is None:
+                scores = dict(token_scores)
+            else:
+                scores = {p: s + token_scores[p] for p, s in scores.items() if p in token_scores}
+            if not scores:
+                return []
+
+        exact_tokens = str(query).lower().split()
+        for position in scores:
+            if self._names[position] == folded_query:
+                scores[position] += FULL_NAME_BONUS
+            # Gõ đúng dấu thì được ưu tiên hơn tên trùng khi bỏ dấu
+            exact_name_tokens = self._exact_tokens[position]
+            if all(token in exact_name_tokens for token in exact_tokens):
+                scores[position] += ACCENT_BONUS
+
+        ranked = sorted(scores, key=lambda p: (-scores[p], self._names[p]))
+        return [self._records[p] for p in ranked[:k]]
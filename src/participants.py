@@ -0,0 +1,127 @@
+"""
+Participant lookup index for the participants_profile sheet.
+Built once per workbook version so each lookup is a dict hit instead of a DataFrame scan.
+"""
+import json
+import math
+from dataclasses import dataclass
+
+from name_search import NameSearchIndex
+
+
+def normalize_name(name):
+    """Normalize a name the same way the old DataFrame mask did"""
+    return str(name).lower().strip()
+
+
+def _is_missing(value):
+    """True for None / NaN / NaT cells"""
+    if value is None:
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return True
+    # pandas.NaT and pandas.NA compare unequal to themselves
+    try:
+        return bool(value != value)
+    except (TypeError, ValueError):
+        return False
+
+
+def _as_id(value):
+    """Convert an id cell (int, float like 45678.0, or digit string) to int"""
+    if _is_missing(value):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return int(value) if value.isdigit() else None
+    try:
+        as_int = int(value)
+    except (TypeError, ValueError):
+        return None
+    return as_int if as_int == value else None
+
+
+def _as_priority(value):
+    """Queue priority from the optional priority column: a number, or x / yes / vip for 1"""
+    if _is_missing(value):
+        return 0
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ("", "0", "no", "false"):
+            return 0
+        try:
+            return int(float(value))
+        except ValueError:
+            return 1
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def participant_key(data):
+    """Stable key for a participant row: the employee ID, else the name"""
+    participant_id = _as_id(data.get("id"))
+    return str(participant_id) if participant_id is not None else data.get("name")
+
+
+@dataclass(frozen=True)
+class ParticipantRecord:
+    """One prebuilt participants_profile row"""
+    data: dict
+    fixed_response: object = None
+    text_to_inject: object = None
+    # json.dumps(data) cho prompt, tạo sẵn một lần khi dựng snapshot
+    payload: str = None
+    # Thứ tự ưu tiên khi xếp hàng chờ Gemini (VIP, khách được đánh dấu trước)
+    priority: int = 0
+
+    @property
+    def key(self):
+        """Value that get() resolves back to this record"""
+        return participant_key(self.data)
+
+
+class ParticipantIndex:
+    """ID and normalized-name lookup over prebuilt participant records"""
+
+    def __init__(self, rows):
+        self.records = []
+        self._by_id = {}
+        self._by_name = {}
+        for row in rows:
+            data = {k: (None if _is_missing(v) else v) for k, v in row.items()}
+            fixed_response = data.pop("fixed_response", None)
+            text_to_inject = data.pop("text_to_inject", None)
+            priority = _as_priority(data.pop("priority", None))
+            payload = json.dumps(data, ensure_ascii=False, default=str)
+            record = ParticipantRecord(data, fixed_response, text_to_inject, payload, priority)
+            self.records.append(record)
+
+            # First row wins, same as result.iloc[0] before
+            participant_id = _as_id(data.get("id"))
+            if participant_id is not None:
+                self._by_id.setdefault(participant_id, record)
+            if data.get("name") is not None:
+                self._by_name.setdefault(normalize_name(data["name"]), record)
+        self._name_search = NameSearchIndex(self.records)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Build the index from the participants_profile DataFrame"""
+        return cls(df.to_dict("records"))
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, user_id):
+        """Look up by employee ID (int or digit string) or by full name, None if not found"""
+        if isinstance(user_id, int) or (isinstance(user_id, str) and user_id.isdigit()):
+            return self._by_id.get(int(user_id))
+        if isinstance(user_id, str):
+            return self._by_name.get(normalize_name(user_id))
+        raise ValueError("user_id must be an employee ID or a name")
+
+    def search(self, query, k=5):
+        """Accent-insensitive fuzzy name search, best candidates first"""
+        return self._name_search.search(query, k)
@@ -0,0 +1,120 @@
+"""
+Pre-generate fortunes for the whole guest list before the event.
+
+    python src/pregenerate.py --concurrency 4
+    python src/pregenerate.py --fortune-numbers "" 1 2 3
+
+Safe to stop and re-run: fortunes already in the store (same participant row
+and prompt version) are skipped.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+from context_cache import GeminiContextCacheProvider, PromptPrefixCache
+from context_retrieval import DEFAULT_TOKEN_BUDGET, ContextRetriever
+from fortune import PROMPT_VERSION, create_model, generate_response, response_text
+from fortune_store import DEFAULT_STORE_PATH, FortuneStore, row_hash
+from llm import AsyncLLM
+from participants import ParticipantIndex
+from usage_store import DEFAULT_EVENT, DEFAULT_USAGE_PATH, UsageStore
+from workbook import LOCAL_WORKBOOK
+from workbook_snapshot import load_workbook_data, snapshot_path_for
+
+load_dotenv()
+
+
+def pending_jobs(index, store, fortune_numbers):
+    """(record, fortune_number, row hash) for every fortune not yet in the store"""
+    jobs = []
+    for record in index.records:
+        if record.fixed_response is not None and str(record.fixed_response).strip() != "":
+            continue
+        digest = row_hash(record.data, record.text_to_inject)
+        for fortune_number in fortune_numbers:
+            if store.get(record.key, fortune_number, digest, PROMPT_VERSION) is None:
+                jobs.append((record, fortune_number, digest))
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate fortunes for every guest in participants_profile")
+    parser.add_argument("--workbook", default=LOCAL_WORKBOOK, help="guest workbook (.xlsx)")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="SQLite file the app reads first")
+    parser.add_argument("--concurrency", type=int, default=4, help="max LLM calls in flight")
+    parser.add_argument("--fortune-numbers", nargs="*", default=[""],
+                        help='fortune numbers to pre-generate, "" means no number drawn')
+    parser.add_argument("--model", default=os.getenv("AI_MODEL"))
+    parser.add_argument("--no-context-cache", action="store_true",
+                        help="send the full prompt every time instead of using Gemini context caching")
+    parser.add_argument("--context-token-budget", type=int,
+                        default=int(os.getenv("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+                        help="max tokens of company context / role passages per prompt, 0 sends everything")
+    args = parser.parse_args()
+
+    # Cùng nguồn dữ liệu với app để row hash khớp nhau
+    with open(args.workbook, "rb") as f:
+        rows, company_context, role_definition = load_workbook_data(f.read(), snapshot_path_for(args.workbook))
+    index = ParticipantIndex(rows)
+    retriever = ContextRetriever(company_context, role_definition, args.context_token_budget)
+    filtered = args.context_token_budget > 0 and not retriever.fits
+    store = FortuneStore(args.store)
+    usage = UsageStore(os.getenv("USAGE_STORE_PATH", DEFAULT_USAGE_PATH), os.getenv("EVENT_NAME", DEFAULT_EVENT))
+    jobs = pending_jobs(index, store, args.fortune_numbers)
+    print(f"{len(index)} guests, {len(jobs)} fortunes to generate, {len(store)} already stored")
+    if not jobs:
+        return
+
+    model = AsyncLLM(create_model(args.model, os.getenv("GEMINI_API_KEY")), max_concurrency=max(1, args.concurrency))
+    context_cache = None
+    if not args.no_context_cache and not filtered:
+        context_cache = PromptPrefixCache(GeminiContextCacheProvider(os.getenv("GEMINI_API_KEY")), args.model)
+
+    def run(job):
+        record, fortune_number, digest = job
+        # Giống app: chỉ đưa các đoạn ngữ cảnh liên quan đến người này
+        contexts = retriever.select(record.data) if filtered else (company_context, role_definition)
+        try:
+            response = generate_response(record.data, model, *contexts,
+                                         record.text_to_inject, fortune_number, context_cache, record.payload)
+        except Exception:
+            usage.record(args.model, None, source="pregenerate:failed")
+            raise
+        text = response_text(response)
+        if not text.strip():
+            # Bị chặn an toàn hoặc hết token: không lưu câu rỗng, lần chạy sau thử lại
+            usage.record(args.model, getattr(response, 'usage_metadata', None), source="pregenerate:failed")
+            raise ValueError(f"Empty reply for {record.key} #{fortune_number or '-'}")
+        usage.record(args.model, getattr(response, 'usage_metadata', None), source="pregenerate")
+        return job, text
+
+    start_time = time.time()
+    done = failed = 0
+    executor = ThreadPoolExecutor(max_workers=max(1, args.concurrency))
+    try:
+        futures = [executor.submit(run, job) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                (record, fortune_number, digest), text = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ {e}")
+                continue
+            # Lưu ngay từng câu để chạy lại không phải gọi lại
+            store.put(record.key, fortune_number, digest, PROMPT_VERSION, args.model, text)
+            done += 1
+            print(f"✓ [{done + failed}/{len(jobs)}] {record.data.get('name')} #{fortune_number or '-'}")
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping, run again to resume...")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    print(f"Done: {done} generated, {failed} failed in {time.time() - start_time:.1f}s")
+    store.close()
+    usage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+HTML building blocks for the Streamlit pages.
+"""
+import base64
+import random
+import re
+from functools import lru_cache
+from pathlib import Path
+
+ZODIAC_SVG_DIR = Path(__file__).parent.resolve().parent / "data" / "images" / "zodiac_signs"
+ZODIAC_EMOJI = ['♈', '♉', '♊', '♋', '♌', '♍', '♎', '♏', '♐', '♑', '♒', '♓']
+
+
+def minify_svg(svg):
+    """Drop the XML prolog, comments, metadata and whitespace between tags"""
+    svg = re.sub(r"<\?xml[^>]*\?>|<!DOCTYPE[^>]*>|<!--.*?-->|<metadata\b.*?</metadata>", "", svg, flags=re.S)
+    svg = re.sub(r">\s+<", "><", svg)
+    return re.sub(r"\s{2,}", " ", svg).strip()
+
+
+@lru_cache(maxsize=None)
+def svg_img_html(svg_file, width=50, height=50):
+    """SVG file as a base64 <img>, None if the file is missing; read once per process"""
+    try:
+        with open(svg_file, "r", encoding="utf-8") as f:
+            svg = minify_svg(f.read())
+    except FileNotFoundError:
+        return None
+    b64 = base64.b64encode(svg.encode("utf-8")).decode("utf-8")
+    return f'<img src="data:image/svg+xml;base64,{b64}" width="{width}" height="{height}"/>'
+
+
+@lru_cache(maxsize=None)
+def stars_html(loading=False):
+    """50 twinkling stars, same positions on every page (seeded)"""
+    rng = random.Random(42)
+    stars = []
+    for _ in range(50):
+        x = rng.randint(0, 100)
+        y = rng.randint(0, 100)
+        size = rng.randint(2, 4)
+        delay = rng.uniform(0, 3)
+        stars.append(f'<div class="star" style="left:{x}%; top:{y}%; width:{size}px; height:{size}px; animation-delay:{delay}s;"></div>')
+    return f'<div class="stars-bg {"loading" if loading else ""}">' + "".join(stars) + '</div>'
+
+
+@lru_cache(maxsize=None)
+def zodiac_wheel_html(loading=False, assets=None, svg_dir=ZODIAC_SVG_DIR):
+    """The 12-sign wheel (emoji where an SVG is missing), built once per loading state.
+    With an AssetManifest the SVGs are linked by URL, otherwise inlined as base64."""
+    symbols = []
+    for i in range(1, 13):
+        url = assets.url(f"zodiac_signs/{i}.svg") if assets is not None else None
+        if url:
+            rendered = f'<img src="{url}" width="200" height="200"/>'
+        else:
+            rendered = svg_img_html(str(Path(svg_dir) / f"{i}.svg"), width=200, height=200)
+        # Không có file SVG thì dùng emoji
+        symbols.append(rendered or f'<span style="font-size: 80px;">{ZODIAC_EMOJI[i - 1]}</span>')
+
+    wheel = [f'<div class="zodiac-wheel {"loading" if loading else ""}"><div class="zodiac-wheel-inner">']
+    for i, symbol in enumerate(symbols):
+        angle = i * 30
+        wheel.append(f'''<div class="zodiac-symbol" style="transform: translate(-50%, -50%) rotate({angle}deg) translateY(-450px) rotate(-{angle}deg);">
+        {symbol}
+    </div>''')
+    wheel.append('</div></div>')
+    return "".join(wheel)
+
+
+def result_card_html(user_data, response, animate=True):
+    """Fortune result card; animate=False skips the slide-up so streamed updates don't flicker"""
+    animation_class = "" if animate else " no-animation"
+    team_html = f'''<p style='
+                        color: #64748b;
+                        margin-bottom: 24px;
+                        font-size: 1.2rem;
+                        font-weight: bold;
+                    '>
+                        <strong>🏢 Nhóm:</strong> {user_data['team']}
+                    </p>''' if user_data.get('team') else "Khách mời"
+
+    return f"""
+        <div class='result-container{animation_class}' style='
+            background: white;
+            border-radius: 24px;
+            padding: 32px;
+            box-shadow: 0 8px 32px rgba(34, 211, 238, 0.3);
+            margin: 32px auto;
+            max-width: 800px;'>
+            <h2 style='
+                font-size: 2rem;
+                color: #f59e0b;
+                margin-bottom: 16px;
+                border-bottom: 2px solid #fde047;
+                padding-bottom: 16px;
+                font-weight: bold;'>
+                ✨ {user_data.get('name', 'Bạn')}
+            </h2>
+            {team_html}
+            <h3 style='
+                font-size: 1.5rem;
+                color: #f59e0b;
+                margin-bottom: 16px;'>
+                🔮 Lời bói của bạn:
+            </h3>
+            <div style='
+                background: linear-gradient(135deg, #fef3c7 0%, #fed7aa 100%);
+                padding: 24px;
+                border-radius: 16px;
+                border: 2px solid #fde047;'>
+                <p style='
+                    color: #1f2937;
+                    font-size: 1.1rem;
+                    line-height: 1.8;
+                    margin: 0;'>{response}</p>
+            </div>
+        </div>
+    """
+
+
+def queue_ticket_html(ticket):
+    """Queue ticket while waiting for a Gemini slot: number, position and estimated wait"""
+    eta = ticket.get('eta_seconds') or 0
+    wait_text = f"khoảng {int(eta) + 1} giây" if eta < 60 else f"khoảng {int(eta // 60) + 1} phút"
+    return f"""
+        <div style='
+            background: white;
+            border-radius: 24px;
+            padding: 24px 32px;
+            box-shadow: 0 8px 32px rgba(34, 211, 238, 0.3);
+            margin: 32px auto;
+            max-width: 480px;
+            text-align: center;'>
+            <p style='color: #64748b; font-size: 1.1rem; margin: 0;'>🎟️ Vé số</p>
+            <p style='color: #f59e0b; font-size: 3rem; font-weight: bold; margin: 0;'>#{ticket['ticket']}</p>
+            <p style='color: #1f2937; font-size: 1.2rem; margin: 8px 0 0 0;'>
+                Còn <strong>{max(0, ticket['position'] - 1)}</strong> người trước bạn · {wait_text}
+            </p>
+        </div>
+    """
@@ -0,0 +1,215 @@
+"""
+Retry, backoff and circuit breaker around Gemini calls.
+
+Rate limits (429) and server errors (5xx) are retried with full-jitter
+exponential backoff, waiting at least as long as the provider's Retry-After.
+After failure_threshold consecutive failures the breaker opens and calls fail
+at once with CircuitOpenError for reset_timeout seconds, so the caller can
+serve a fallback instead of making guests wait; then one trial call is let
+through to close it again.
+"""
+import random
+import re
+import threading
+import time
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+_STATUS_IN_MESSAGE = re.compile(r"\b(408|429|500|502|503|504)\b|RESOURCE_EXHAUSTED|UNAVAILABLE|DEADLINE_EXCEEDED|INTERNAL")
+_RETRY_DELAY_IN_MESSAGE = re.compile(r"retry(?:Delay|[ _-]?after|[ _-]?in)?['\":= ]+(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+
+class CircuitOpenError(RuntimeError):
+    """The model failed too often recently; not called"""
+
+
+def status_code(exc):
+    """HTTP-like status of a provider exception, None if unknown"""
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(exc):
+    """429 / 5xx / timeouts are worth retrying, bad requests and auth errors are not"""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    # langchain bọc lỗi của Google thành exception chung, chỉ còn mã lỗi trong message
+    return bool(_STATUS_IN_MESSAGE.search(str(exc)))
+
+
+def is_rate_limited(exc):
+    """True for a 429 / RESOURCE_EXHAUSTED answer"""
+    code = status_code(exc)
+    if code is not None:
+        return code == 429
+    return bool(re.search(r"\b429\b|RESOURCE_EXHAUSTED", str(exc)))
+
+
+def retry_after(exc):
+    """Seconds the provider asked us to wait (Retry-After header or RetryInfo), None if not given"""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        value = headers.get("Retry-After") or headers.get("retry-after")
+    if value is None:
+        match = _RETRY_DELAY_IN_MESSAGE.search(str(exc))
+        value = match.group(1) if match else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0, hint=None, rng=random):
+    """Full-jitter exponential delay for retry number attempt (0-based), at least hint"""
+    delay = rng.uniform(0, min(cap, base * 2 ** attempt))
+    return max(delay, hint) if hint is not None else delay
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open trial after reset_timeout"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """True if a call may go out now (only one trial call while half-open)"""
+        return self.acquire() is not None
+
+    def acquire(self):
+        """None if no call may go out now, else "call", or "trial" for the one half-open trial call"""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return "call"
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return "trial"
+            return None
+
+    def release(self, permit):
+        """End of a call; a trial that recorded no outcome (closed early, bad request) is given back"""
+        if permit == "trial":
+            with self._lock:
+                self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial:
+                    print(f"Circuit breaker open after {self.failures} failures")
+                self.opened_at = self.clock()
+            self._trial = False
+
+
+class ResilientLLM:
+    """invoke()/stream() with retries and a circuit breaker in front of a chat model"""
+
+    def __init__(self, model, retries=3, base_delay=0.5, max_delay=8.0, max_wait=30.0,
+                 breaker=None, sleep=time.sleep, rng=random, on_rate_limited=None):
+        self.model = model
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        self.rng = rng
+        # Báo cho scheduler giảm số lượt gọi đồng thời khi bị 429
+        self.on_rate_limited = on_rate_limited
+
+    def _before_call(self):
+        permit = self.breaker.acquire()
+        if permit is None:
+            raise CircuitOpenError("Model temporarily disabled after repeated failures")
+        return permit
+
+    def _after_failure(self, exc, attempt):
+        """Record the failure; returns the delay before the next attempt or raises"""
+        retryable = is_retryable(exc)
+        if self.on_rate_limited is not None and is_rate_limited(exc):
+            self.on_rate_limited(exc)
+        if retryable:
+            self.breaker.record_failure()
+        if not retryable or attempt >= self.retries:
+            raise exc
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay, retry_after(exc), self.rng)
+        if delay > self.max_wait:
+            # Bắt chờ quá lâu thì thôi, để bên gọi dùng câu dự phòng
+            raise exc
+        print(f"Model call failed ({exc}), retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+        return delay
+
+    def invoke(self, messages, **kwargs):
+        attempt = 0
+        while True:
+            permit = self._before_call()
+            try:
+                response = self.model.invoke(messages, **kwargs)
+            except Exception as e:
+                delay = self._after_failure(e, attempt)
+            else:
+                self.breaker.record_success()
+                return response
+            finally:
+                self.breaker.release(permit)
+            self.sleep(delay)
+            attempt += 1
+
+    def stream(self, messages, **kwargs):
+        """Retries only until the first chunk; a failure mid-reply is raised to the caller.
+        Closing the generator early (hedge lost, deadline, guest left) records nothing."""
+        attempt = 0
+        while True:
+            permit = self._before_call()
+            started = False
+            try:
+                for chunk in self.model.stream(messages, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started:
+                    if is_retryable(e):
+                        self.breaker.record_failure()
+                    raise
+                delay = self._after_failure(e, attempt)
+            else:
+                self.breaker.record_success()
+                return
+            finally:
+                # Lượt thử half-open không có kết quả thì trả lại, tránh kẹt cầu dao mãi
+                self.breaker.release(permit)
+            self.sleep(delay)
+            attempt += 1
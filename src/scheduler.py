@@ -0,0 +1,207 @@
+"""
+Admission control for Gemini calls: a ticket queue in front of the model.
+
+When the whole room lines up after a program segment, every kiosk asks for a
+fortune at once. Generations take a ticket and wait their turn:
+
+    order        higher priority first (VIP / pre-flagged guests), then FIFO
+    concurrency  at most `limit` generations at a time; the limit grows by one
+                 per `limit` successes up to max_concurrency and is halved on a
+                 rate-limit (429) answer, so we sit just under the quota instead
+                 of retrying into a 429 storm
+    rate         optional token bucket of rate_per_minute calls (the API quota)
+
+Each waiting ticket knows its position and an ETA from the measured service
+times of recent generations. There is one scheduler per process: with several
+uvicorn workers each one gets its share of the limits (see api.py) and the
+queue positions only cover that worker.
+"""
+import heapq
+import itertools
+import math
+import statistics
+import threading
+import time
+from collections import deque
+
+
+class Ticket:
+    """One queued generation; wait() until admitted, then release() when done"""
+
+    def __init__(self, scheduler, number, priority, enqueued_at):
+        self.scheduler = scheduler
+        self.number = number
+        self.priority = priority
+        self.enqueued_at = enqueued_at
+        self.admitted_at = None
+        self.state = "waiting"  # waiting / running / done / cancelled
+
+    def wait(self, timeout=None):
+        """True once admitted, False if still waiting after timeout seconds"""
+        return self.scheduler._wait(self, timeout)
+
+    def info(self):
+        """{"ticket", "position", "eta_seconds"} for the guest's screen"""
+        return self.scheduler.ticket_info(self)
+
+    def release(self, ok=False):
+        """Free the slot (admitted) or leave the queue (still waiting); ok if the generation succeeded"""
+        self.scheduler._release(self, ok)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.release(ok=exc_type is None)
+
+
+class FortuneScheduler:
+    """Priority + FIFO queue with an adaptive concurrency limit and a token bucket"""
+
+    def __init__(self, max_concurrency=4, rate_per_minute=None, min_concurrency=1,
+                 default_service_seconds=6.0, window=50, clock=time.monotonic):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.rate_per_minute = rate_per_minute or None
+        self.default_service_seconds = default_service_seconds
+        self.clock = clock
+        self.limit = float(self.max_concurrency)
+        self.running = 0
+        self.throttled = 0
+        self._service_times = deque(maxlen=window)
+        self._waiting = []  # heap of (-priority, number, ticket)
+        self._numbers = itertools.count(1)
+        self._tokens = float(self._burst)
+        self._refilled_at = clock()
+        self._last_cut = None
+        self._cond = threading.Condition()
+
+    @property
+    def _burst(self):
+        # Cho phép dồn tối đa một giây hạn mức (ít nhất 1 lượt)
+        return max(1.0, self.rate_per_minute / 60.0) if self.rate_per_minute else 0.0
+
+    def submit(self, priority=0):
+        """New ticket at the back of its priority class; may be admitted right away"""
+        with self._cond:
+            ticket = Ticket(self, next(self._numbers), priority, self.clock())
+            heapq.heappush(self._waiting, (-priority, ticket.number, ticket))
+            self._dispatch()
+            return ticket
+
+    def _refill(self):
+        if self.rate_per_minute is None:
+            return
+        now = self.clock()
+        self._tokens = min(self._burst, self._tokens + (now - self._refilled_at) * self.rate_per_minute / 60.0)
+        self._refilled_at = now
+
+    def _next_token_in(self):
+        """Seconds until the bucket has a whole token; 0 if it has one or there is no bucket"""
+        if self.rate_per_minute is None or self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) * 60.0 / self.rate_per_minute
+
+    def _dispatch(self):
+        """Admit waiting tickets in order while there is a free slot and a token; _cond held"""
+        self._refill()
+        admitted = False
+        while self._waiting and self.running < int(self.limit):
+            ticket = self._waiting[0][2]
+            if ticket.state != "waiting":
+                heapq.heappop(self._waiting)
+                continue
+            if self.rate_per_minute is not None:
+                if self._tokens < 1:
+                    break
+                self._tokens -= 1
+            heapq.heappop(self._waiting)
+            ticket.state = "running"
+            ticket.admitted_at = self.clock()
+            self.running += 1
+            admitted = True
+        if admitted:
+            self._cond.notify_all()
+
+    def _wait(self, ticket, timeout):
+        with self._cond:
+            end = None if timeout is None else self.clock() + timeout
+            while ticket.state == "waiting":
+                self._dispatch()
+                if ticket.state != "waiting":
+                    break
+                remaining = None if end is None else end - self.clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # Hết token thì tự thức dậy khi bucket đầy lại, không cần ai notify
+                token_wait = self._next_token_in() if self.running < int(self.limit) else 0.0
+                waits = [w for w in (remaining, token_wait or None) if w is not None]
+                self._cond.wait(min(waits) if waits else None)
+            return ticket.state == "running"
+
+    def _release(self, ticket, ok):
+        with self._cond:
+            if ticket.state == "running":
+                self.running -= 1
+                self._service_times.append(self.clock() - ticket.admitted_at)
+                if ok:
+                    # Tăng dần: thêm 1 slot sau mỗi `limit` lượt thành công; lượt lỗi / 429 không tính
+                    self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+                ticket.state = "done"
+            elif ticket.state == "waiting":
+                ticket.state = "cancelled"
+            self._dispatch()
+            self._cond.notify_all()
+
+    def throttle(self, exc=None):
+        """The API answered 429: halve the concurrency limit (once per service time)"""
+        with self._cond:
+            self.throttled += 1
+            now = self.clock()
+            if self._last_cut is not None and now - self._last_cut < self.service_seconds():
+                # Cả loạt 429 của cùng một đợt chỉ tính là một lần
+                return
+            self._last_cut = now
+            self.limit = max(float(self.min_concurrency), self.limit / 2)
+            if self.rate_per_minute is not None:
+                self._tokens = min(self._tokens, 0.0)
+            print(f"Rate limited by the model API, concurrency limit now {int(self.limit)}")
+
+    def service_seconds(self):
+        """Median duration of recent generations, the default until there are some"""
+        if not self._service_times:
+            return self.default_service_seconds
+        return statistics.median(self._service_times)
+
+    def ticket_info(self, ticket):
+        with self._cond:
+            if ticket.state != "waiting":
+                return {"ticket": ticket.number, "position": 0, "eta_seconds": 0.0}
+            ahead = sum(1 for _, _, other in self._waiting
+                        if other.state == "waiting" and (-other.priority, other.number) < (-ticket.priority, ticket.number))
+            return {"ticket": ticket.number, "position": ahead + 1, "eta_seconds": round(self._eta(ahead), 1)}
+
+    def _eta(self, ahead):
+        """Seconds until a ticket with `ahead` tickets in front of it is admitted; _cond held"""
+        slots = max(1, int(self.limit))
+        service = self.service_seconds()
+        # Mỗi "vòng" phục vụ `slots` người; nếu đang đầy slot thì phải chờ thêm một vòng
+        rounds = ahead // slots + (1 if self.running >= slots else 0)
+        eta = rounds * service
+        if self.rate_per_minute is not None:
+            eta = max(eta, (ahead + 1 - math.floor(self._tokens)) * 60.0 / self.rate_per_minute)
+        return max(0.0, eta)
+
+    def status(self):
+        """Queue snapshot for /queue and the admin page"""
+        with self._cond:
+            self._refill()
+            return {
+                "waiting": sum(1 for _, _, ticket in self._waiting if ticket.state == "waiting"),
+                "running": self.running,
+                "limit": int(self.limit),
+                "max_concurrency": self.max_concurrency,
+                "rate_per_minute": self.rate_per_minute,
+                "service_seconds": round(self.service_seconds(), 2),
+                "throttled": self.throttled,
+            }
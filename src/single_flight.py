@@ -0,0 +1,153 @@
+"""
+Single-flight coalescing for fortune generation.
+
+Concurrent requests with the same cache key (double click, two kiosks with the
+same ID and fortune number) share one LLM call: the first one starts it, the
+others subscribe to the same buffered stream and replay every piece from the
+start. Whoever is waiting for the next piece pulls it, so the call finishes
+even if the request that started it goes away; once every subscriber has
+left, the call is stopped and forgotten so a new request starts afresh.
+
+Coalescing only works within one process: with several API workers, two
+kiosks asking for the same fortune at once can still reach two workers.
+"""
+import threading
+
+
+class SharedStream:
+    """One underlying iterator of text pieces, replayed to every subscriber"""
+
+    def __init__(self, factory, on_complete=None):
+        self._factory = factory
+        self._on_complete = on_complete
+        self._source = None
+        self._iterator = None
+        self._pieces = []
+        self._done = False
+        self._error = None
+        self._pump = threading.Lock()
+        self.subscribers = 0
+
+    @property
+    def text(self):
+        return "".join(self._pieces)
+
+    def _advance(self):
+        """Pull one piece from the source; called with _pump held"""
+        try:
+            if self._source is None:
+                self._source = self._factory()
+                self._iterator = iter(self._source)
+            self._pieces.append(next(self._iterator))
+        except StopIteration:
+            self._done = True
+            if self._on_complete is not None:
+                self._on_complete(self._source, self.text)
+        except Exception as e:
+            self._error = e
+            self._done = True
+
+    def close(self):
+        """Stop the underlying stream without completing it (every subscriber left)"""
+        with self._pump:
+            if self._done:
+                return
+            self._done = True
+            self._error = RuntimeError("Generation abandoned by every subscriber")
+            for obj in (self._iterator, self._source):
+                close = getattr(obj, "close", None)
+                if close is not None:
+                    close()
+
+    def __iter__(self):
+        i = 0
+        while True:
+            # list.append là nguyên tử, đọc phần đã có không cần khóa
+            if i < len(self._pieces):
+                yield self._pieces[i]
+                i += 1
+                continue
+            with self._pump:
+                if i < len(self._pieces):
+                    continue
+                if self._done:
+                    break
+                self._advance()
+        if self._error is not None:
+            raise self._error
+
+
+class SingleFlight:
+    """In-flight SharedStreams by key; an entry lives only until its call finishes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def join(self, key, factory, on_complete=None):
+        """(stream, leader): leader is True if this call started the generation"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                def finish(source, text):
+                    try:
+                        if on_complete is not None:
+                            on_complete(source, text)
+                    finally:
+                        self._forget(key, flight)
+
+                flight = SharedStream(factory, finish)
+                self._flights[key] = flight
+            flight.subscribers += 1
+        return _Subscription(self, key, flight), leader
+
+    def _leave(self, key, flight):
+        """One subscriber is gone; the last one stops an unfinished call"""
+        with self._lock:
+            flight.subscribers -= 1
+            abandoned = flight.subscribers <= 0 and not flight._done
+            if abandoned and self._flights.get(key) is flight:
+                # Bỏ entry trong cùng khóa để request mới không nhập vào lượt gọi sắp dừng
+                del self._flights[key]
+        if abandoned:
+            flight.close()
+
+    def _forget(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._flights)
+
+
+class _Subscription:
+    """Iterates a SharedStream; drops the in-flight entry if the call fails"""
+
+    def __init__(self, owner, key, flight):
+        self._owner = owner
+        self._key = key
+        self.flight = flight
+        self._left = False
+
+    @property
+    def text(self):
+        return self.flight.text
+
+    def __iter__(self):
+        try:
+            yield from self.flight
+        except Exception:
+            # Lỗi thì bỏ entry để lần bấm sau gọi lại LLM
+            self._owner._forget(self._key, self.flight)
+            raise
+        finally:
+            self.close()
+
+    def close(self):
+        """Leave the flight; safe to call more than once"""
+        if not self._left:
+            self._left = True
+            self._owner._leave(self._key, self.flight)
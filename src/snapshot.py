@@ -0,0 +1,91 @@
+"""
+Background workbook refresher.
+
+One thread per server process polls the workbook (local or SharePoint) and builds
+a complete Snapshot off the request path, then publishes it with a single reference
+assignment. A request reads current() once and keeps that snapshot to the end, so it
+never sees a half-built or empty cache and never waits on a download.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+from context_retrieval import DEFAULT_TOKEN_BUDGET, ContextRetriever
+from metrics import METRICS
+from participants import ParticipantIndex
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Everything a fortune request needs from one workbook version"""
+    version: object
+    index: ParticipantIndex
+    company_context: str
+    role_definition: str
+    loaded_at: float
+    # None khi tắt lọc ngữ cảnh: prompt dùng toàn bộ company_context / role_definition
+    context: ContextRetriever = None
+
+
+class SnapshotRefresher:
+    """Polls a LocalWorkbook / SharePointWorkbook every interval seconds"""
+
+    def __init__(self, source, interval=60, context_token_budget=DEFAULT_TOKEN_BUDGET):
+        self.source = source
+        self.interval = interval
+        self.context_token_budget = context_token_budget
+        # Gọi listener(snapshot) sau mỗi lần publish, vd. xóa context cache của prefix cũ
+        self.listeners = []
+        self._snapshot = None
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="workbook-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def current(self, timeout=60):
+        """Latest snapshot; only the very first call after startup may wait for it"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            if not self._ready.wait(timeout):
+                raise TimeoutError("Workbook is not loaded yet")
+            snapshot = self._snapshot
+        return snapshot
+
+    def refresh_now(self, force=False):
+        """Check the source right away (reload button); returns the FetchResult"""
+        return self._refresh(force)
+
+    def _run(self):
+        while True:
+            try:
+                self._refresh()
+            except Exception as e:
+                # Giữ snapshot cũ nếu tải lỗi, thử lại ở lần sau
+                print(f"Workbook refresh failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _refresh(self, force=False):
+        with self._lock:
+            with METRICS.timer("workbook_fetch", source=type(self.source).__name__) as timings:
+                result = self.source.fetch(force=force)
+                timings.labels["changed"] = result.changed
+            if result.changed or self._snapshot is None:
+                rows, company_context, role_definition = self.source.data
+                context = None
+                if self.context_token_budget:
+                    context = ContextRetriever(company_context, role_definition, self.context_token_budget)
+                snapshot = Snapshot(result.version, ParticipantIndex(rows),
+                                    company_context, role_definition, time.time(), context)
+                self._snapshot = snapshot
+                self._ready.set()
+                print(f"Workbook snapshot published: {len(snapshot.index)} participants, version {result.version}")
+                for listener in self.listeners:
+                    listener(snapshot)
+            return result
@@ -0,0 +1,107 @@
+"""
+Speculative fortune generation for the kiosk.
+
+As soon as the typed ID (and fortune number) resolves to one participant, the
+request starts in a background thread and its (event, payload) pairs are
+buffered; pressing the button claims them if the inputs still match, replaying
+what already arrived and following the rest live. The model latency hides
+behind the time the guest spends typing and clicking.
+
+A speculation that is never claimed is cancelled while it has not streamed
+anything yet (its queue ticket is given back); once the model is answering it
+runs to the end so the fortune cache keeps the result for the real request.
+Nothing is speculated while guests are waiting in the queue.
+"""
+import threading
+
+
+def speculation_key(query, fortune_number):
+    return (str(query or "").strip(), str(fortune_number or "").strip())
+
+
+class Speculation:
+    """One background fortune request whose events wait to be claimed"""
+
+    def __init__(self, client, query, fortune_number=None):
+        self.client = client
+        self.query = query
+        self.fortune_number = fortune_number
+        self.key = speculation_key(query, fortune_number)
+        self.events = []
+        self.done = False
+        self.error = None
+        self.skipped = None
+        self._cancelled = threading.Event()
+        self._cond = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self._run, name="speculation", daemon=True).start()
+        return self
+
+    def matches(self, query, fortune_number):
+        return self.key == speculation_key(query, fortune_number)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _append(self, event, payload):
+        with self._cond:
+            self.events.append((event, payload))
+            self._cond.notify_all()
+
+    def _run(self):
+        stream = None
+        try:
+            queue = getattr(self.client, "queue", None)
+            status = queue() if queue is not None else None
+            if status and status["waiting"] > 0:
+                # Đang có khách xếp hàng thật thì không chen lượt đoán trước
+                self.skipped = "queue busy"
+                return
+            found = self.client.participant(self.query)
+            if found["participant"] is None or self._cancelled.is_set():
+                self.skipped = "no single participant" if found["participant"] is None else "cancelled"
+                return
+            print(f"Speculating fortune for {found['participant']['key']}")
+            streaming = False
+            stream = self.client.stream(found["participant"]["key"], self.fortune_number)
+            for event, payload in stream:
+                streaming = streaming or event == "delta"
+                self._append(event, payload)
+                if self._cancelled.is_set() and not streaming:
+                    self.skipped = "cancelled"
+                    return
+        except Exception as e:
+            print(f"Speculative generation failed: {e}")
+            self.error = e
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    def claim(self):
+        """The buffered-then-live events, None if this speculation has nothing usable"""
+        with self._cond:
+            # Chờ đến khi biết có lượt sinh hay không (tra cứu người chơi rất nhanh)
+            while not self.events and not self.done:
+                self._cond.wait()
+            if not self.events:
+                return None
+        return self._replay()
+
+    def _replay(self):
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.events) and not self.done:
+                    self._cond.wait()
+                if i >= len(self.events):
+                    break
+                event = self.events[i]
+            i += 1
+            yield event
+        if self.error is not None:
+            raise self.error
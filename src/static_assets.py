@@ -0,0 +1,119 @@
+"""
+Static file server for the page's images (zodiac SVGs, background pictures).
+
+Every file under data/images gets a content-hashed URL (zodiac_signs/1.3f9a2c1d.svg),
+so it can be cached by the browser for a year, and a gzip variant built once at
+startup. The page then only carries <img src="..."> tags instead of megabytes of
+base64 on every rerun.
+
+    STATIC_ASSETS_URL=http://192.168.1.10:8765  # URL the kiosk browsers can reach
+    STATIC_ASSETS_PORT=8765
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+IMAGES_DIR = Path(__file__).parent.resolve().parent / "data" / "images"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+mimetypes.add_type("image/svg+xml", ".svg")
+
+
+class Asset:
+    """One file: its bytes, gzip variant (if it helps) and content hash"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.body = f.read()
+        self.digest = hashlib.sha256(self.body).hexdigest()[:16]
+        self.content_type = mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+        gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        # PNG/JPG đã nén sẵn, chỉ giữ bản gzip nếu nhỏ hơn thật sự
+        self.gzip_body = gzipped if len(gzipped) < len(self.body) * 0.9 else None
+
+
+class AssetManifest:
+    """Hashed URLs for every file under root"""
+
+    def __init__(self, root=IMAGES_DIR, base_url=""):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        self._urls = {}
+        self._assets = {}
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file():
+                continue
+            name = path.relative_to(self.root).as_posix()
+            asset = Asset(path)
+            stem, ext = os.path.splitext(name)
+            hashed = f"{stem}.{asset.digest}{ext}"
+            self._urls[name] = f"{self.base_url}/assets/{hashed}"
+            self._assets[hashed] = asset
+
+    def url(self, name):
+        """URL of data/images/<name>, None if there is no such file"""
+        return self._urls.get(name)
+
+    def lookup(self, hashed_name):
+        return self._assets.get(hashed_name)
+
+    def __len__(self):
+        return len(self._assets)
+
+
+def _handler(manifest):
+    class AssetHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._serve(send_body=True)
+
+        def do_HEAD(self):
+            self._serve(send_body=False)
+
+        def _serve(self, send_body):
+            path = self.path.split("?", 1)[0]
+            asset = manifest.lookup(path[len("/assets/"):]) if path.startswith("/assets/") else None
+            if asset is None:
+                self.send_error(404)
+                return
+            etag = f'"{asset.digest}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", CACHE_CONTROL)
+                self.end_headers()
+                return
+
+            body = asset.body
+            use_gzip = asset.gzip_body is not None and "gzip" in self.headers.get("Accept-Encoding", "")
+            self.send_response(200)
+            self.send_header("Content-Type", asset.content_type)
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            if use_gzip:
+                body = asset.gzip_body
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return AssetHandler
+
+
+def start_asset_server(base_url, port=8765, host="0.0.0.0", root=IMAGES_DIR):
+    """Build the manifest and serve it from a daemon thread; returns the manifest"""
+    manifest = AssetManifest(root, base_url)
+    server = ThreadingHTTPServer((host, port), _handler(manifest))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="static-assets", daemon=True).start()
+    print(f"Static assets: {len(manifest)} files on {host}:{port}, served as {manifest.base_url}/assets/")
+    return manifest
@@ -0,0 +1,124 @@
+"""
+Token and cost accounting for every Gemini call.
+
+Each call records input, output and cached (context cache hit) tokens with the
+model name into SQLite, so the admin page can show per-hour and per-event totals
+and export them as CSV. Costs are estimates from PRICES, not the invoice.
+"""
+import csv
+import sqlite3
+import threading
+import time
+
+DEFAULT_USAGE_PATH = "data/usage.db"
+DEFAULT_EVENT = "year-end-2025"
+
+# USD per 1M tokens: (input, cached input, output). Longest matching prefix wins.
+PRICES = {
+    "gemini-3-pro": (2.00, 0.20, 12.00),
+    "gemini-3-flash": (0.50, 0.05, 3.00),
+    "gemini-2.5-pro": (1.25, 0.125, 10.00),
+    "gemini-2.5-flash-lite": (0.10, 0.01, 0.40),
+    "gemini-2.5-flash": (0.30, 0.03, 2.50),
+    "gemini-2.0-flash": (0.10, 0.025, 0.40),
+}
+
+COLUMNS = ("ts", "event", "source", "model", "input_tokens", "output_tokens", "cached_tokens", "cost_usd")
+
+
+def usage_counts(usage_metadata):
+    """(input, output, cached) tokens from a langchain usage_metadata dict"""
+    if not usage_metadata:
+        return 0, 0, 0
+    details = usage_metadata.get("input_token_details") or {}
+    return (int(usage_metadata.get("input_tokens") or 0),
+            int(usage_metadata.get("output_tokens") or 0),
+            int(details.get("cache_read") or 0))
+
+
+def estimate_cost(model, input_tokens, output_tokens, cached_tokens=0, prices=PRICES):
+    """Estimated USD for one call, None for a model missing from the price table"""
+    name = (model or "").lower().removeprefix("models/")
+    matches = [prefix for prefix in prices if name.startswith(prefix)]
+    if not matches:
+        return None
+    input_price, cached_price, output_price = prices[max(matches, key=len)]
+    # Token đọc từ context cache tính giá rẻ hơn, phần còn lại giá input thường
+    billed_input = max(input_tokens - cached_tokens, 0)
+    return (billed_input * input_price + cached_tokens * cached_price + output_tokens * output_price) / 1_000_000
+
+
+class UsageStore:
+    """One row per LLM call, aggregated on read"""
+
+    def __init__(self, path=DEFAULT_USAGE_PATH, event=DEFAULT_EVENT):
+        self.path = path
+        self.event = event
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_usage (
+                ts REAL NOT NULL,
+                event TEXT NOT NULL,
+                source TEXT NOT NULL,
+                model TEXT,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                cached_tokens INTEGER NOT NULL,
+                cost_usd REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_usage_ts ON llm_usage (ts)")
+        self._conn.commit()
+
+    def record(self, model, usage_metadata, source="app", event=None):
+        """Store the usage of one call; returns (input, output, cached, cost)"""
+        input_tokens, output_tokens, cached_tokens = usage_counts(usage_metadata)
+        cost = estimate_cost(model, input_tokens, output_tokens, cached_tokens)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO llm_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), event or self.event, source, model, input_tokens, output_tokens, cached_tokens, cost),
+            )
+            self._conn.commit()
+        return input_tokens, output_tokens, cached_tokens, cost
+
+    def _totals(self, group_by, where="", params=()):
+        with self._lock:
+            cursor = self._conn.execute(f"""
+                SELECT {group_by} AS bucket, model, COUNT(*), SUM(input_tokens), SUM(output_tokens),
+                       SUM(cached_tokens), SUM(cost_usd)
+                FROM llm_usage {where}
+                GROUP BY bucket, model ORDER BY bucket, model
+            """, params)
+            return [dict(zip(("bucket", "model", "calls", "input_tokens", "output_tokens", "cached_tokens", "cost_usd"), row))
+                    for row in cursor.fetchall()]
+
+    def hourly_totals(self, event=None):
+        """Totals per local hour ('2025-12-26 18:00') and model"""
+        where, params = ("WHERE event = ?", (event,)) if event else ("", ())
+        return self._totals("strftime('%Y-%m-%d %H:00', ts, 'unixepoch', 'localtime')", where, params)
+
+    def event_totals(self):
+        """Totals per event and model"""
+        return self._totals("event")
+
+    def export_csv(self, file, event=None):
+        """Write every call (oldest first) as CSV to an open text file"""
+        where, params = ("WHERE event = ?", (event,)) if event else ("", ())
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM llm_usage {where} ORDER BY ts", params).fetchall()
+        writer = csv.writer(file)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow((time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row[0])),) + tuple(row[1:]))
+        return len(rows)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_usage").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
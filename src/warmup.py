@@ -0,0 +1,178 @@
+"""
+Startup warm-up for a FortuneService.
+
+Runs once in a background thread when the service is created, so the first
+guest doesn't pay for it:
+
+    workbook  wait for the first snapshot (download / parse, participant and
+              name-search indexes, context retrieval index)
+    prompt    compile the prompt prefix per language and create the context caches
+    model     build the Gemini client(s)
+    priming   one tiny request per model, opening the TLS connection the
+              shared async client keeps alive
+
+Each model (primary, fallback) is built and primed on its own, so a primary
+that is down doesn't keep the fallback cold; status()["models"] reports each.
+
+status() is what /ready reports. ready flips only after every stage has run;
+if a model fails to build or prime the service is still ready (the other model
+or fallback fortunes answer) but reported as degraded.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from fortune import build_prompt, prompt_language
+from llm import LazyModel
+
+STAGES = ("workbook", "prompt", "model", "priming")
+PRIMING_PROMPT = "Trả lời đúng một từ: OK"
+
+
+def _lazy_model(model):
+    """The LazyModel under ResilientLLM / AsyncLLM wrappers, None if there is none"""
+    while model is not None and not isinstance(model, LazyModel):
+        model = getattr(model, "model", None)
+    return model
+
+
+class Warmup:
+    """Progress of one service's warm-up; thread-safe to read"""
+
+    def __init__(self):
+        self.stages = {name: {"state": "pending"} for name in STAGES}
+        # "primary" / "fallback" -> {"model", "state": pending / built / ready / failed, "seconds", "error"}
+        self.models = {}
+        self.ready = threading.Event()
+        self.started_at = None
+        self.finished_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def status(self):
+        """{"ready", "degraded", "seconds", "stages": {name: {"state", "seconds", "error"}},
+        "models": {role: {"model", "state", "seconds", "error"}}}"""
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self.stages.items()}
+            models = {role: dict(model) for role, model in self.models.items()}
+        end = self.finished_at or time.time()
+        return {
+            "ready": self.ready.is_set(),
+            "degraded": any(stage["state"] == "failed" for stage in stages.values()),
+            "seconds": round(end - self.started_at, 3) if self.started_at else None,
+            "stages": stages,
+            "models": models,
+        }
+
+    def start(self, service, prime_model=True, workbook_timeout=60):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, args=(service, prime_model, workbook_timeout),
+                                            name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    @contextmanager
+    def _stage(self, name):
+        with self._lock:
+            self.stages[name] = {"state": "running"}
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] = {"state": "failed", "seconds": round(seconds, 3), "error": str(e)}
+            print(f"Warm-up: {name} failed after {seconds:.1f}s: {e}")
+        else:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] = {"state": "done", "seconds": round(seconds, 3)}
+            print(f"Warm-up: {name} done in {seconds:.1f}s")
+
+    def _skip(self, name, reason):
+        with self._lock:
+            self.stages[name] = {"state": "skipped", "reason": reason}
+        print(f"Warm-up: {name} skipped ({reason})")
+
+    def run(self, service, prime_model=True, workbook_timeout=60):
+        self.started_at = time.time()
+        snapshot = None
+        with self._stage("workbook"):
+            while snapshot is None:
+                try:
+                    snapshot = service.refresher.current(timeout=workbook_timeout)
+                except TimeoutError as e:
+                    # Chưa có workbook thì chưa thể bói cho ai: chờ tiếp, chưa báo ready
+                    print(f"Warm-up: still waiting for the workbook ({e})")
+            print(f"Warm-up: {len(snapshot.index)} participants loaded")
+
+        with self._stage("prompt"):
+            self._warm_prompts(service, snapshot)
+
+        models = [(role, model, name) for role, model, name in
+                  (("primary", service.model, service.model_name),
+                   ("fallback", service.fallback_model, service.fallback_model_name)) if model is not None]
+        with self._lock:
+            self.models = {role: {"model": name, "state": "pending"} for role, _, name in models}
+        with self._stage("model"):
+            self._each_model(models, "built", self._build)
+
+        if prime_model:
+            with self._stage("priming"):
+                self._each_model(models, "ready", lambda role, model, name: self._prime(service, model, name))
+        else:
+            self._skip("priming", "disabled")
+
+        self.finished_at = time.time()
+        self.ready.set()
+        status = self.status()
+        print(f"Warm-up finished in {status['seconds']:.1f}s" + (" (degraded)" if status["degraded"] else ""))
+
+    def _warm_prompts(self, service, snapshot):
+        """One prompt per language: compiles the prefix and creates its context cache"""
+        seen = set()
+        for record in snapshot.index.records:
+            language = prompt_language(record.data)
+            if language in seen:
+                continue
+            seen.add(language)
+            company_context, role_definition, context_cache = service.prompt_context(snapshot, record.data)
+            if context_cache is not None:
+                context_cache.cached_content(language, company_context, role_definition)
+            build_prompt(record.data, company_context, role_definition, record.text_to_inject, payload=record.payload)
+
+    def _each_model(self, models, state, action):
+        """action(role, model, name) for every model that hasn't failed yet, each on its own;
+        raises at the end if any of them failed"""
+        failed = []
+        for role, model, name in models:
+            if self.models[role]["state"] == "failed":
+                continue
+            start = time.perf_counter()
+            try:
+                action(role, model, name)
+            except Exception as e:
+                failed.append(role)
+                update = {"state": "failed", "error": str(e)}
+                print(f"Warm-up: {role} model {name} failed: {e}")
+            else:
+                update = {"state": state}
+            with self._lock:
+                self.models[role].update(update, seconds=round(time.perf_counter() - start, 3))
+        if failed:
+            raise RuntimeError(f"{' and '.join(failed)} model failed")
+
+    def _build(self, role, model, name):
+        lazy = _lazy_model(model)
+        if lazy is not None:
+            lazy.get()
+
+    def _prime(self, service, model, name):
+        from langchain_core.messages import HumanMessage
+
+        response = model.invoke([HumanMessage(content=PRIMING_PROMPT)])
+        if service.usage is not None:
+            service.usage.record(name, getattr(response, "usage_metadata", None), source="warmup")
@@ -0,0 +1,122 @@
+"""
+Reading the guest workbook (participants_profile, company_context, role_definition),
+from disk or conditionally from SharePoint.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+from workbook_snapshot import load_workbook_data, read_header, read_snapshot, snapshot_path_for
+
+LOCAL_WORKBOOK = "data/guest_information.xlsx"
+DEFAULT_SITE_URL = "https://mabmotor-my.sharepoint.com/personal/vnm13649_mabuchi-motor_com"
+DEFAULT_FILE_URL = "/personal/vnm13649_mabuchi-motor_com/Documents/Microsoft Teams Chat Files/guest_information 1.xlsx"
+SHAREPOINT_SNAPSHOT = "data/sharepoint_workbook.snap"
+
+# changed: a new version was downloaded and parsed; seconds: wall time of the whole check
+FetchResult = namedtuple("FetchResult", "changed seconds version")
+
+
+def parse_workbook(source):
+    """Parse a workbook path or file-like object into (df, company_context, role_definition)"""
+    # pandas + openpyxl chỉ cần khi không có snapshot nhị phân khớp với file
+    import pandas as pd
+
+    xls = pd.ExcelFile(source)
+    df = pd.read_excel(xls, "participants_profile")
+    company_context = pd.read_excel(xls, "company_context")
+    role_definition = pd.read_excel(xls, "role_definition")
+    return df, company_context['text'][0], role_definition['text'][0]
+
+
+class LocalWorkbook:
+    """The guest workbook on disk; .data is (rows, company_context, role_definition),
+    read from the snapshot next to it unless the file content changed"""
+
+    def __init__(self, path=LOCAL_WORKBOOK, snapshot_path=None):
+        self.path = path
+        self.snapshot_path = snapshot_path or snapshot_path_for(path)
+        self.version = None
+        self.data = None
+        self._lock = threading.Lock()
+
+    def fetch(self, force=False):
+        """Load the workbook only if the file changed since the last fetch"""
+        start = time.perf_counter()
+        with self._lock:
+            stat = os.stat(self.path)
+            version = (stat.st_mtime_ns, stat.st_size)
+            if not force and self.data is not None and version == self.version:
+                return FetchResult(False, time.perf_counter() - start, version)
+
+            with open(self.path, "rb") as f:
+                self.data = load_workbook_data(f.read(), self.snapshot_path)
+            self.version = version
+            return FetchResult(True, time.perf_counter() - start, version)
+
+
+class SharePointWorkbook:
+    """The guest workbook on SharePoint, downloaded only when its ETag changes.
+    The last download is kept as a snapshot so a restart with the same ETag skips it."""
+
+    def __init__(self, site_url, username, password, file_relative_url, snapshot_path=SHAREPOINT_SNAPSHOT):
+        from office365.runtime.auth.user_credential import UserCredential
+        from office365.sharepoint.client_context import ClientContext
+        self.ctx = ClientContext(site_url).with_credentials(UserCredential(username, password))
+        self.file_relative_url = file_relative_url
+        self.snapshot_path = snapshot_path
+        self.version = None
+        self.data = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, get_setting):
+        """Build from a getter like os.getenv or get_secret"""
+        return cls(
+            get_setting("SHAREPOINT_SITE_URL", DEFAULT_SITE_URL),
+            get_setting("MICROSOFT_ACCOUNT"),
+            get_setting("MICROSOFT_PASSWORD"),
+            get_setting("SHAREPOINT_FILE_URL", DEFAULT_FILE_URL),
+            get_setting("WORKBOOK_SNAPSHOT_PATH", SHAREPOINT_SNAPSHOT),
+        )
+
+    def remote_version(self):
+        """ETag of the file on SharePoint (last-modified time if no ETag)"""
+        file = self.ctx.web.get_file_by_server_relative_url(self.file_relative_url).get().execute_query()
+        properties = file.properties
+        return properties.get("ETag") or properties.get("TimeLastModified")
+
+    def fetch(self, force=False):
+        """Download and parse the workbook only if it changed since the last fetch"""
+        from office365.sharepoint.files.file import File
+        start = time.perf_counter()
+        with self._lock:
+            version = self.remote_version()
+            if not force and self.data is not None and version == self.version:
+                return FetchResult(False, time.perf_counter() - start, version)
+
+            if not force and self.data is None and self._load_snapshot(version):
+                seconds = time.perf_counter() - start
+                print(f"Workbook loaded from snapshot in {seconds:.2f}s (ETag {version} unchanged)")
+                return FetchResult(True, seconds, version)
+
+            response = File.open_binary(self.ctx, self.file_relative_url)
+            self.data = load_workbook_data(response.content, self.snapshot_path, source_version=version)
+            self.version = version
+            seconds = time.perf_counter() - start
+            print(f"Workbook reloaded from SharePoint in {seconds:.2f}s ({len(response.content)} bytes, ETag {version})")
+            return FetchResult(True, seconds, version)
+
+    def _load_snapshot(self, version):
+        """Use the snapshot of the previous run if it was taken from this same ETag"""
+        header = read_header(self.snapshot_path)
+        if not header or header.get("source_version") != version:
+            return False
+        snapshot = read_snapshot(self.snapshot_path)
+        if snapshot is None:
+            return False
+        _, rows, company_context, role_definition = snapshot
+        self.data = (rows, company_context, role_definition)
+        self.version = version
+        return True
@@ -0,0 +1,156 @@
+"""
+Compact columnar snapshot of the guest workbook.
+
+Parsing the .xlsx with openpyxl takes seconds; the snapshot keeps only the
+participants_profile columns plus the two context texts, stamped with the
+SHA-256 of the source workbook, and loads through mmap in milliseconds.
+The Excel file is only parsed again when its hash changes.
+
+    python src/workbook_snapshot.py data/guest_information.xlsx
+
+File layout: MAGIC, 8-byte little-endian header length, JSON header
+(source hash/version, row count, column offsets), then one UTF-8 JSON
+array per column.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"MBSNAP1\n"
+_LENGTH = struct.Struct("<Q")
+
+
+def content_hash(raw):
+    """SHA-256 of the workbook bytes"""
+    return hashlib.sha256(raw).hexdigest()
+
+
+def snapshot_path_for(workbook_path):
+    """data/guest_information.xlsx -> data/guest_information.snap"""
+    return os.path.splitext(workbook_path)[0] + ".snap"
+
+
+def _is_missing(value):
+    return value is None or value != value
+
+
+def table_columns(df):
+    """{column: JSON-safe values} for the needed participants_profile columns (NaN -> None)"""
+    columns = {}
+    for name in df.columns:
+        if str(name).startswith("Unnamed"):
+            continue
+        values = [None if _is_missing(v) else v for v in df[name].tolist()]
+        columns[str(name)] = json.loads(json.dumps(values, ensure_ascii=False, default=str))
+    return columns
+
+
+def columns_to_rows(columns):
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def write_snapshot(path, columns, company_context, role_definition, source_hash, source_version=None):
+    """Write the table_columns() of participants_profile and the context texts"""
+    blobs = []
+    header = {
+        "source_hash": source_hash,
+        "source_version": source_version,
+        "rows": len(next(iter(columns.values()), [])),
+        "columns": [],
+    }
+    offset = 0
+    for name, values in columns.items():
+        blob = json.dumps(values, ensure_ascii=False).encode("utf-8")
+        header["columns"].append({"name": name, "offset": offset, "length": len(blob)})
+        blobs.append(blob)
+        offset += len(blob)
+    for key, text in (("company_context", company_context), ("role_definition", role_definition)):
+        blob = json.dumps(text, ensure_ascii=False, default=str).encode("utf-8")
+        header[key] = {"offset": offset, "length": len(blob)}
+        blobs.append(blob)
+        offset += len(blob)
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_LENGTH.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    # Ghi file tạm rồi đổi tên để không ai đọc phải snapshot ghi dở
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """Snapshot header dict, or None if the file is missing or not a snapshot"""
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+            return json.loads(f.read(length))
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def read_snapshot(path):
+    """(header, rows, company_context, role_definition) or None if unreadable"""
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                return None
+            start = len(MAGIC)
+            (length,) = _LENGTH.unpack(mm[start:start + _LENGTH.size])
+            start += _LENGTH.size
+            header = json.loads(mm[start:start + length])
+            body = start + length
+
+            def load(ref):
+                return json.loads(mm[body + ref["offset"]:body + ref["offset"] + ref["length"]])
+
+            columns = {c["name"]: load(c) for c in header["columns"]}
+            return header, columns_to_rows(columns), load(header["company_context"]), load(header["role_definition"])
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        print(f"Snapshot {path} unreadable: {e}")
+        return None
+
+
+def load_workbook_data(raw, snapshot_path, source_version=None):
+    """(rows, company_context, role_definition) for workbook bytes, from the snapshot when
+    its hash matches, else parsed from Excel (and the snapshot rewritten)"""
+    from workbook import parse_workbook
+    from io import BytesIO
+
+    digest = content_hash(raw)
+    header = read_header(snapshot_path)
+    if header and header.get("source_hash") == digest:
+        snapshot = read_snapshot(snapshot_path)
+        if snapshot is not None:
+            _, rows, company_context, role_definition = snapshot
+            return rows, company_context, role_definition
+
+    df, company_context, role_definition = parse_workbook(BytesIO(raw))
+    columns = table_columns(df)
+    try:
+        write_snapshot(snapshot_path, columns, company_context, role_definition, digest, source_version)
+    except OSError as e:
+        print(f"Could not write snapshot {snapshot_path}: {e}")
+    return columns_to_rows(columns), company_context, role_definition
+
+
+def main():
+    workbook_path = sys.argv[1] if len(sys.argv) > 1 else "data/guest_information.xlsx"
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else snapshot_path_for(workbook_path)
+    with open(workbook_path, "rb") as f:
+        raw = f.read()
+    rows, _, _ = load_workbook_data(raw, snapshot_path)
+    print(f"✓ {snapshot_path}: {len(rows)} participants, {os.path.getsize(snapshot_path)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Load test of the fortune request path against the fake LLM.
+
+Drives the real FortuneService (participant lookup and fuzzy name search, prompt
+build, the Gemini queue, retries and the circuit breaker) and the result card
+rendering with N concurrent simulated kiosk sessions over a synthetic
+participants_profile. All sessions share one fake model that stands for the API
+quota: at most --capacity calls at once, the rest get a 429, so throughput is
+bounded the way the real deployment is.
+Run from the repo root:
+
+    python test_modules/benchmark.py
+    python test_modules/benchmark.py --rows 10000 --sessions 1 16 64 --ttft 1.5 --capacity 8 --error-rate 0.05
+"""
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fake_llm import FakeChatModel, StaticRefresher
+from fortune_service import FortuneService
+from llm import AsyncLLM
+from metrics import Metrics
+from name_search import fold_accents
+from participants import ParticipantIndex
+from render import result_card_html
+from resilience import ResilientLLM
+from scheduler import FortuneScheduler
+
+FAMILY = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ", "Takeuchi", "Suzuki"]
+MIDDLE = ["Văn", "Thị", "Đức", "Minh", "Ngọc", "Thanh", "Hữu", "Quang", ""]
+GIVEN = ["An", "Bình", "Chi", "Dương", "Giang", "Hà", "Hương", "Khoa", "Linh", "Long", "Nam", "Phát", "Quân",
+         "Sơn", "Tâm", "Thảo", "Trang", "Tuấn", "Vy", "Yến", "Takanori", "Hiroshi"]
+TEAMS = ["QLKTSX", "KTCTTP", "PE2", "QA", "HR", "IT", "Kho", "Bảo trì"]
+
+COMPANY_CONTEXT = "Mabuchi Motor Đà Nẵng - bối cảnh công ty. " * 200
+ROLE_DEFINITION = "Vai trò thầy bói văn phòng. " * 100
+
+
+def synthetic_rows(count, seed=42):
+    """participants_profile rows shaped like the real sheet"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        name = " ".join(part for part in (rng.choice(FAMILY), rng.choice(MIDDLE), rng.choice(GIVEN)) if part)
+        rows.append({
+            "id": 10000 + i,
+            "name": name,
+            "age": rng.randint(22, 60),
+            "team": rng.choice(TEAMS),
+            "exp_level": rng.choice(["junior", "mid", "senior"]),
+            "seniority_range": rng.choice(["0-2", "3-5", "6-10", "10+"]),
+            "skill_signature": "Excel, PLC, 5S",
+            "pain_point": "họp nhiều, deadline gấp",
+            "roast_level": rng.randint(1, 5),
+            "rencent_work_highlight": "dự án cải tiến dây chuyền",
+            "preferred_style": rng.choice(["hài hước", "nhẹ nhàng"]),
+            "nationality": "JP" if name.split()[0] in ("Takeuchi", "Suzuki") else "VN",
+            "fixed_response": None,
+            "text_to_inject": None,
+        })
+    return rows
+
+
+def make_query(rng, rows):
+    """What a guest types: mostly the ID, sometimes the name without accents or with a typo"""
+    row = rng.choice(rows)
+    roll = rng.random()
+    if roll < 0.7:
+        return str(row["id"])
+    name = fold_accents(row["name"]) if roll < 0.9 else row["name"]
+    if roll >= 0.9 and len(name) > 4:
+        i = rng.randrange(1, len(name) - 1)
+        name = name[:i] + name[i + 1:]
+    return name
+
+
+def build_service(index, model, args, metrics):
+    """Same wrappers as FortuneService.from_settings, without caches so every request reaches the model"""
+    scheduler = FortuneScheduler(args.queue_concurrency or args.capacity, rate_per_minute=args.rate_per_minute)
+    llm = ResilientLLM(AsyncLLM(model, max_concurrency=args.capacity * 2), on_rate_limited=scheduler.throttle)
+    return FortuneService(StaticRefresher(index, COMPANY_CONTEXT, ROLE_DEFINITION), llm, "fake", metrics=metrics, scheduler=scheduler,
+                          deadline_seconds=args.deadline)
+
+
+def run_session(session, service, rows, args, metrics):
+    rng = random.Random(args.seed * 1000 + session)
+    sources = Counter()
+    for _ in range(args.requests):
+        timings = metrics.start(session=session)
+        query = make_query(rng, rows)
+        # Số quẻ ngẫu nhiên để các khách trùng ID không gộp chung một lượt gọi
+        fortune_number = str(rng.randint(1, 99))
+        for _attempt in range(2):
+            candidates = None
+            user_data, text, last_render = None, "", 0
+            for event, payload in service.stream(query, fortune_number, timings):
+                if event == "participant":
+                    user_data = payload["data"]
+                elif event == "candidates":
+                    candidates = payload
+                elif event == "delta":
+                    text += payload
+                    if time.time() - last_render > 0.1:
+                        with timings.stage("render"):
+                            result_card_html(user_data, text, animate=False)
+                        last_render = time.time()
+                elif event == "done":
+                    with timings.stage("render"):
+                        result_card_html(user_data, payload["response"])
+            if not candidates:
+                break
+            # Khách chọn tên đầu tiên trong danh sách "did you mean"
+            query = candidates[0]["key"]
+        sources[timings.labels.get("source")] += 1
+        metrics.finish(timings)
+        if args.think_time:
+            time.sleep(rng.uniform(0, args.think_time))
+    return sources
+
+
+def run(rows, sessions, args):
+    build_start = time.perf_counter()
+    index = ParticipantIndex(rows)
+    build_seconds = time.perf_counter() - build_start
+
+    metrics = Metrics(log_path=None)
+    model = FakeChatModel(ttft=args.ttft, tokens_per_second=args.tps, reply_tokens=args.reply_tokens,
+                          error_rate=args.error_rate, seed=args.seed, max_concurrency=args.capacity)
+    service = build_service(index, model, args, metrics)
+    start = time.perf_counter()
+    # Log thử lại / hàng đợi của service in ra stdout, bỏ đi trong lúc đo
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            sources = sum(executor.map(lambda s: run_session(s, service, rows, args, metrics), range(sessions)),
+                          Counter())
+    elapsed = time.perf_counter() - start
+    return build_seconds, elapsed, sources, model, service.queue(), metrics.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fortune path with a fake LLM")
+    parser.add_argument("--rows", type=int, nargs="*", default=[70, 1000, 10000])
+    parser.add_argument("--sessions", type=int, nargs="*", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=10, help="requests per session")
+    parser.add_argument("--ttft", type=float, default=0.8, help="fake time to first token (s)")
+    parser.add_argument("--tps", type=float, default=40, help="fake tokens per second")
+    parser.add_argument("--reply-tokens", type=int, default=150)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--capacity", type=int, default=8, help="fake API: concurrent calls before it answers 429")
+    parser.add_argument("--queue-concurrency", type=int, default=None, help="scheduler limit (default: --capacity)")
+    parser.add_argument("--rate-per-minute", type=float, default=None, help="scheduler token bucket")
+    parser.add_argument("--deadline", type=float, default=25, help="end-to-end deadline per request (s)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between a session's requests (s)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    stages = ("participant_lookup", "queue_wait", "prompt_build", "llm_ttft", "llm_total", "render", "total")
+    print(f"fake LLM: ttft {args.ttft}s, {args.tps} tok/s, {args.reply_tokens} tokens, error rate {args.error_rate}, "
+          f"capacity {args.capacity}")
+    for row_count in args.rows:
+        rows = synthetic_rows(row_count, args.seed)
+        for sessions in args.sessions:
+            build, elapsed, sources, model, queue, summary = run(rows, sessions, args)
+            total = sum(sources.values())
+            served = sources["llm"] + sources["coalesced"]
+            print(f"\n== {row_count} rows, {sessions} sessions: {total} requests in {elapsed:.1f}s "
+                  f"({served / elapsed:.2f} generated/s), index built in {build * 1000:.0f} ms")
+            print(f"   sources: {dict(sources)}")
+            print(f"   model: {model.calls} calls, peak {model.peak} at once, {model.rejected} rejected (429); "
+                  f"queue limit {queue['limit']}, throttled {queue['throttled']}x")
+            print(f"   {'stage':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+            for stage in stages:
+                if stage in summary:
+                    s = summary[stage]
+                    print(f"   {stage:<20}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}")
+
+
+if __name__ == "__main__":
+    main()
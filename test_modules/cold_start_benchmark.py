@@ -0,0 +1,143 @@
+"""
+Cold-start benchmark for each entry point: import time (python -X importtime),
+which heavy dependencies got loaded, and the Streamlit first render (AppTest),
+each in a fresh interpreter. Results are appended to data/cold_start.jsonl with
+the git revision so runs can be compared over time.
+Run from the repo root:
+
+    python test_modules/cold_start_benchmark.py
+    python test_modules/cold_start_benchmark.py --entry app_streamlit --repeat 5 --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC = os.path.join(ROOT, "src")
+ENTRY_POINTS = ["app_streamlit", "app_hybrid", "app", "admin", "api"]
+STREAMLIT_APPS = {"app_streamlit", "app_hybrid", "app", "admin"}
+# Những gói nặng phải được nạp lười, không nằm trên đường khởi động
+HEAVY = ["pandas", "langchain_core", "langchain_google_genai", "google.genai", "office365"]
+DEFAULT_OUTPUT = os.path.join(ROOT, "data", "cold_start.jsonl")
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+import json
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_RENDER = """
+import json, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file({path!r}, default_timeout={timeout}).run()
+print(json.dumps({{"seconds": time.perf_counter() - start, "exceptions": [str(e.value) for e in at.exception]}}))
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SRC + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def _run(args):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=_env(), capture_output=True, text=True)
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure_import(module):
+    """(seconds, heavy modules loaded, top-level imports by cumulative time)"""
+    result = _run(["-X", "importtime", "-c", _PROBE.format(module=module, heavy=HEAVY)])
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(result.stderr)
+    # importtime in module con trước module cha: cây của entry point là các dòng
+    # sâu hơn nằm ngay trước dòng depth 0 của nó
+    end = max(i for i, row in enumerate(rows) if row[0] == module and row[3] == 0)
+    start = end
+    while start > 0 and rows[start - 1][3] > 0:
+        start -= 1
+    top = sorted(((name, cumulative) for name, _, cumulative, depth in rows[start:end] if depth == 1),
+                 key=lambda item: -item[1])
+    return probe["seconds"], probe["loaded"], top
+
+
+def measure_render(module, timeout):
+    result = _run(["-c", _RENDER.format(path=os.path.join(SRC, f"{module}.py"), timeout=timeout)])
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "render failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and first render of each entry point")
+    parser.add_argument("--entry", nargs="*", default=ENTRY_POINTS, help="entry point modules in src/")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per measurement, median is kept")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list per entry point")
+    parser.add_argument("--no-render", action="store_true", help="skip the Streamlit first render")
+    parser.add_argument("--render-timeout", type=float, default=60)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help='JSONL file to append results to, "" to skip')
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.entry:
+        entry = results[module] = {}
+        try:
+            runs = [measure_import(module) for _ in range(max(1, args.repeat))]
+        except RuntimeError as e:
+            print(f"{module}: import failed: {e}")
+            entry["error"] = str(e)
+            continue
+        entry["import_ms"] = round(statistics.median(seconds for seconds, _, _ in runs) * 1000, 1)
+        entry["heavy_loaded"] = runs[-1][1]
+        entry["top_imports_ms"] = {name: round(us / 1000, 1) for name, us in runs[-1][2][:args.top]}
+        print(f"\n{module}: import {entry['import_ms']:.0f} ms, heavy loaded: {', '.join(entry['heavy_loaded']) or 'none'}")
+        for name, ms in entry["top_imports_ms"].items():
+            print(f"  {ms:9.1f} ms  {name}")
+
+        if module in STREAMLIT_APPS and not args.no_render:
+            try:
+                renders = [measure_render(module, args.render_timeout) for _ in range(max(1, args.repeat))]
+            except RuntimeError as e:
+                print(f"  first render skipped: {e}")
+                continue
+            entry["first_render_ms"] = round(statistics.median(r["seconds"] for r in renders) * 1000, 1)
+            entry["render_exceptions"] = renders[-1]["exceptions"]
+            print(f"  first render {entry['first_render_ms']:.0f} ms"
+                  + (f" ({len(entry['render_exceptions'])} exceptions)" if entry["render_exceptions"] else ""))
+
+    if args.output:
+        line = {"ts": time.time(), "revision": git_revision(), "python": sys.version.split()[0], "results": results}
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        print(f"\nAppended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Offline check of the prompt prefix context cache against the local provider stand-in.
+Run from the repo root: python test_modules/context_cache_check.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from context_cache import LocalContextCacheProvider, PromptPrefixCache
+from fortune import build_prefix, generate_response
+from snapshot import SnapshotRefresher
+from workbook import FetchResult
+
+
+class RecordingModel:
+    """Records what would have been sent to Gemini"""
+
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, messages, **kwargs):
+        self.calls.append((messages, kwargs))
+        return None
+
+
+vn_guest = {"id": 1, "name": "Lê Minh Dương", "nationality": "VN", "team": "QLKTSX"}
+jp_guest = {"id": 2, "name": "Takeuchi Takanori", "nationality": "JP", "team": "KTCTTP"}
+
+# Prefix is byte-identical across guests of the same language
+assert build_prefix("vi", "ctx", "roles") == build_prefix("vi", "ctx", "roles")
+assert build_prefix("vi", "ctx", "roles") != build_prefix("en", "ctx", "roles")
+
+provider = LocalContextCacheProvider()
+cache = PromptPrefixCache(provider, "gemini-test", ttl_seconds=3600, renew_margin=300)
+model = RecordingModel()
+
+generate_response(vn_guest, model, "ctx", "roles", None, "7", context_cache=cache)
+generate_response(dict(vn_guest, id=3), model, "ctx", "roles", None, None, context_cache=cache)
+generate_response(jp_guest, model, "ctx", "roles", None, None, context_cache=cache)
+creates = [c for c in provider.calls if c[0] == "create"]
+assert len(creates) == 2, provider.calls  # one per language
+vn_cache = model.calls[0][1]["cached_content"]
+assert model.calls[1][1]["cached_content"] == vn_cache
+assert model.calls[2][1]["cached_content"] != vn_cache
+# Only the per-guest tail is sent with a cached prefix: no system message, no company context
+assert len(model.calls[0][0]) == 1 and "ctx" not in str(model.calls[0][0])
+
+# Renewed when close to expiry
+provider.caches[vn_cache]["expire_at"] = 0
+cache._entries["vi"] = (cache._entries["vi"][0], vn_cache, 100)
+generate_response(vn_guest, model, "ctx", "roles", None, None, context_cache=cache)
+assert ("refresh", vn_cache) in provider.calls
+
+# Workbook reloaded with new content: old cache deleted, new one created
+generate_response(vn_guest, model, "new ctx", "roles", None, None, context_cache=cache)
+assert ("delete", vn_cache) in provider.calls
+assert model.calls[-1][1]["cached_content"] != vn_cache
+
+# Provider refuses (prefix too small): full prompt is sent, and creation is not retried every call
+small = LocalContextCacheProvider(min_chars=10 ** 6)
+cache = PromptPrefixCache(small, "gemini-test")
+generate_response(vn_guest, model, "ctx", "roles", context_cache=cache)
+generate_response(vn_guest, model, "ctx", "roles", context_cache=cache)
+assert model.calls[-1][1] == {} and len(model.calls[-1][0]) == 2
+assert len(small.calls) == 1
+
+cache.invalidate()
+
+# The provider call runs outside the lock: while one request creates the cache, others send the full prompt
+class SlowProvider(LocalContextCacheProvider):
+    def create(self, *args, **kwargs):
+        time.sleep(0.5)
+        return super().create(*args, **kwargs)
+
+
+slow = SlowProvider()
+cache = PromptPrefixCache(slow, "gemini-test")
+creator = threading.Thread(target=cache.cached_content, args=("vi", "ctx", "roles"))
+creator.start()
+time.sleep(0.1)
+start = time.perf_counter()
+assert cache.cached_content("vi", "ctx", "roles") is None and cache.cached_content("en", "ctx", "roles")
+assert time.perf_counter() - start < 1.0
+creator.join()
+assert cache.cached_content("vi", "ctx", "roles") and len([c for c in slow.calls if c[0] == "create"]) == 2
+
+# Workbook reloaded: only caches whose prefix changed are dropped
+vi_cache = cache.cached_content("vi", "ctx", "roles")
+cache.invalidate("ctx", "roles")
+assert cache.cached_content("vi", "ctx", "roles") == vi_cache
+cache.invalidate("new ctx", "roles")
+assert ("delete", vi_cache) in slow.calls and not cache._entries
+
+
+class EditedWorkbook:
+    """Workbook source whose company context is edited between reloads"""
+
+    def __init__(self):
+        self.company_context = "ctx"
+        self.version = 0
+
+    def fetch(self, force=False):
+        self.version += 1
+        return FetchResult(True, 0.0, self.version)
+
+    @property
+    def data(self):
+        return [vn_guest], self.company_context, "roles"
+
+
+# Registered on the refresher, a reload with a new prefix deletes the old cache right away
+source = EditedWorkbook()
+refresher = SnapshotRefresher(source, context_token_budget=0)
+provider = LocalContextCacheProvider()
+cache = PromptPrefixCache(provider, "gemini-test")
+refresher.listeners.append(lambda snapshot: cache.invalidate(snapshot.company_context, snapshot.role_definition))
+refresher.refresh_now()
+old_cache = cache.cached_content("vi", "ctx", "roles")
+refresher.refresh_now()
+assert ("delete", old_cache) not in provider.calls  # same prefix: kept
+source.company_context = "new ctx"
+refresher.refresh_now()
+assert ("delete", old_cache) in provider.calls
+print("✓ context cache checks passed")
@@ -0,0 +1,35 @@
+"""
+Offline check of the relevance-filtered prompt context on the data/*.txt files.
+Run from the repo root: python test_modules/context_retrieval_check.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from context_retrieval import ContextRetriever, chunk_text, estimate_tokens, tokenize
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "data")
+with open(os.path.join(DATA, "company_context.txt"), encoding="utf-8") as f:
+    company_context = f.read()
+with open(os.path.join(DATA, "role_definition.txt"), encoding="utf-8") as f:
+    role_definition = f.read()
+
+assert tokenize("Phòng Quản lý (QLKTSX)") == ["phong", "quan", "ly", "qlktsx"]
+sections = [section for section, _, _ in chunk_text(company_context)]
+assert sections == sorted(sections) and sections[0] == 0 and len(set(sections)) == 2, sections
+
+full = estimate_tokens(company_context) + estimate_tokens(role_definition)
+retriever = ContextRetriever(company_context, role_definition, token_budget=600)
+for team, wanted, unwanted in (("QLKTSX", "QLKTSX", "KTCTLK"), ("KTCTLK", "KTCTLK", "QLKTSX")):
+    selected = "\n".join(retriever.select({"id": 1, "name": "A", "team": team, "nationality": "VN"}))
+    assert wanted in selected and unwanted not in selected, (team, selected)
+    assert "THÔNG TIN CHUNG" in selected  # general company info always comes first
+    assert estimate_tokens(selected) <= 600 < full, estimate_tokens(selected)
+    print(f"{team}: {estimate_tokens(selected)} of {full} tokens")
+
+# Everything fits: texts come back unchanged so the prefix stays cacheable
+roomy = ContextRetriever(company_context, role_definition, token_budget=full + 1)
+assert roomy.fits and roomy.select({"team": "QLKTSX"}) == (company_context, role_definition)
+
+print("✓ context retrieval checks passed")
@@ -0,0 +1,151 @@
+"""
+Local stand-in for the Gemini chat model, for benchmarks and offline checks.
+
+Behaves like ChatGoogleGenerativeAI for invoke()/stream() and the async
+ainvoke()/astream(): waits ttft seconds, then emits tokens at
+tokens_per_second, and fails with FakeLLMError at error_rate. Seeded, so a run can be repeated exactly.
+With max_concurrency set, one instance stands for the shared API quota: calls
+beyond that many at once are refused with a 429, like Gemini's rate limit.
+StaticRefresher stands in for a loaded workbook, over GUESTS unless given other rows.
+"""
+import asyncio
+import random
+import threading
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from participants import ParticipantIndex
+from snapshot import Snapshot
+
+WORDS = ("năm", "nay", "bạn", "sẽ", "gặp", "deadline", "may", "mắn", "sếp", "họp", "lương", "thưởng",
+         "Excel", "báo", "cáo", "cà", "phê", "overtime", "vui", "vẻ")
+
+GUESTS = [{"id": 1, "name": "Lê Minh Dương", "nationality": "VN", "team": "QLKTSX"},
+          {"id": 2, "name": "Takeuchi Takanori", "nationality": "JP", "team": "KTCTTP"}]
+
+
+def numbered_guests(count):
+    """Guests 1..count, each named Guest <id>"""
+    return [{"id": i, "name": f"Guest {i}", "nationality": "VN", "team": "QLKTSX"} for i in range(1, count + 1)]
+
+
+class StaticRefresher:
+    """One fixed snapshot, like a workbook that has finished loading; rows may be a built ParticipantIndex"""
+
+    def __init__(self, rows=GUESTS, company_context="ctx", role_definition="roles"):
+        index = rows if isinstance(rows, ParticipantIndex) else ParticipantIndex(rows)
+        self.snapshot = Snapshot(1, index, company_context, role_definition, time.time())
+
+    def current(self, timeout=60):
+        return self.snapshot
+
+
+class FakeLLMError(RuntimeError):
+    """Injected failure, stands in for a Gemini 429/5xx"""
+
+    def __init__(self, message, status_code=503, retry_after=None):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class FakeChatModel:
+    """invoke()/stream() with configurable latency, speed and error rate.
+    faults scripts the first calls: None succeeds, a status code (or (status, retry_after)) fails."""
+
+    def __init__(self, ttft=0.8, tokens_per_second=40, reply_tokens=150, error_rate=0.0, seed=None, model="fake-gemini",
+                 faults=None, error_status=503, max_concurrency=None):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.model = model
+        self.faults = list(faults or [])
+        self.error_status = error_status
+        self.max_concurrency = max_concurrency
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self.rejected = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _plan(self):
+        """Draw this call's fate up front so concurrent calls stay reproducible per seed"""
+        with self._lock:
+            self.calls += 1
+            fail_at, fault = None, None
+            if self.faults:
+                fault = self.faults.pop(0)
+                fail_at = None if fault is None else 0
+            elif self._rng.random() < self.error_rate:
+                # Lỗi có thể xảy ra trước token đầu tiên hoặc giữa chừng
+                fail_at = self._rng.choice([0, self._rng.randrange(1, max(2, self.reply_tokens))])
+                fault = self.error_status
+            words = [self._rng.choice(WORDS) for _ in range(self.reply_tokens)]
+        return words, fail_at, fault
+
+    def _enter(self):
+        """Take one of the max_concurrency slots, 429 if they are all busy"""
+        with self._lock:
+            if self.max_concurrency is not None and self.active >= self.max_concurrency:
+                self.rejected += 1
+                raise FakeLLMError("quota exceeded: too many concurrent requests", 429, retry_after=0.2)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def _exit(self):
+        with self._lock:
+            self.active -= 1
+
+    def _error(self, fault, tokens):
+        status, retry_after = fault if isinstance(fault, tuple) else (fault, None)
+        return FakeLLMError(f"injected failure after {tokens} tokens", status, retry_after)
+
+    def _usage(self, messages, output_tokens):
+        input_tokens = max(1, len(str(messages)) // 4)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+    def stream(self, messages, **kwargs):
+        words, fail_at, fault = self._plan()
+        self._enter()
+        try:
+            time.sleep(self.ttft)
+            interval = 1.0 / self.tokens_per_second if self.tokens_per_second else 0
+            for i, word in enumerate(words):
+                if fail_at is not None and i == fail_at:
+                    raise self._error(fault, i)
+                if i:
+                    time.sleep(interval)
+                usage = self._usage(messages, len(words)) if i == len(words) - 1 else None
+                yield AIMessageChunk(content=(" " if i else "") + word, usage_metadata=usage)
+        finally:
+            self._exit()
+
+    async def astream(self, messages, **kwargs):
+        words, fail_at, fault = self._plan()
+        self._enter()
+        try:
+            await asyncio.sleep(self.ttft)
+            interval = 1.0 / self.tokens_per_second if self.tokens_per_second else 0
+            for i, word in enumerate(words):
+                if fail_at is not None and i == fail_at:
+                    raise self._error(fault, i)
+                if i:
+                    await asyncio.sleep(interval)
+                usage = self._usage(messages, len(words)) if i == len(words) - 1 else None
+                yield AIMessageChunk(content=(" " if i else "") + word, usage_metadata=usage)
+        finally:
+            self._exit()
+
+    async def ainvoke(self, messages, **kwargs):
+        text = ""
+        async for chunk in self.astream(messages, **kwargs):
+            text += chunk.content
+        return AIMessage(content=text, usage_metadata=self._usage(messages, self.reply_tokens))
+
+    def invoke(self, messages, **kwargs):
+        text = "".join(chunk.content for chunk in self.stream(messages, **kwargs))
+        return AIMessage(content=text, usage_metadata=self._usage(messages, self.reply_tokens))
@@ -0,0 +1,113 @@
+"""
+Offline check of hedged requests and the end-to-end deadline against the fake LLM.
+Run from the repo root: python test_modules/hedging_check.py
+"""
+import csv
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fake_llm import FakeChatModel, StaticRefresher
+from fortune import ResponseStream
+from fortune_cache import FortuneCache
+from fortune_service import FortuneService
+from hedging import Deadline, DeadlineExceeded, HedgedStream, TtftTracker
+from metrics import Metrics
+from resilience import CircuitBreaker, ResilientLLM
+from usage_store import UsageStore
+
+
+def pieces(model):
+    return lambda: (chunk.content for chunk in model.stream([]))
+
+
+# The tracker waits for enough samples, then follows the recent percentile within its bounds
+tracker = TtftTracker(percentile=0.9, default=3.0, minimum=0.5, maximum=10.0, min_samples=5)
+assert tracker.threshold() == 3.0
+for seconds in (1.0, 1.1, 1.2, 1.3, 2.0):
+    tracker.observe(seconds)
+assert tracker.threshold() == 2.0, tracker.threshold()
+for _ in range(50):
+    tracker.observe(0.01)
+assert tracker.threshold() == 0.5
+
+# Fast primary: no hedge is sent
+fast, backup = FakeChatModel(ttft=0.01, tokens_per_second=0, reply_tokens=5, seed=1), FakeChatModel(ttft=0, seed=2)
+stream = HedgedStream(pieces(fast), pieces(backup), hedge_after=0.5)
+assert len(list(stream)) == 5 and stream.winner == "primary" and not stream.hedged and backup.calls == 0
+
+# Slow primary: the hedge goes out after hedge_after and the fallback wins
+slow = FakeChatModel(ttft=1.0, tokens_per_second=0, reply_tokens=5, seed=1)
+backup = FakeChatModel(ttft=0.05, tokens_per_second=0, reply_tokens=3, seed=2)
+start = time.perf_counter()
+stream = HedgedStream(pieces(slow), pieces(backup), hedge_after=0.1)
+assert len(list(stream)) == 3 and stream.winner == "fallback" and stream.hedged
+assert time.perf_counter() - start < 0.5
+
+# A primary trial call that loses the race is closed without an outcome, and its TTFT still counts
+clock = [0.0]
+breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=lambda: clock[0])
+breaker.record_failure()
+clock[0] = 31
+primary = ResilientLLM(FakeChatModel(ttft=0.3, tokens_per_second=0, reply_tokens=5, seed=1), breaker=breaker)
+backup = FakeChatModel(ttft=0.01, tokens_per_second=0, reply_tokens=3, seed=2)
+tracker = TtftTracker(default=0.1)
+stream = HedgedStream(lambda: ResponseStream(primary.stream([])), pieces(backup), tracker=tracker)
+assert len(list(stream)) == 3 and stream.winner == "fallback"
+time.sleep(0.4)
+assert breaker.state == "half_open" and breaker.allow(), breaker.state
+assert len(tracker._samples) == 1 and tracker._samples[0] >= 0.3, tracker._samples
+
+# Primary fails before its first token: the fallback is called right away
+broken = FakeChatModel(ttft=0, reply_tokens=5, faults=[503], seed=1)
+backup = FakeChatModel(ttft=0, tokens_per_second=0, reply_tokens=3, seed=2)
+stream = HedgedStream(pieces(broken), pieces(backup), hedge_after=5)
+start = time.perf_counter()
+assert len(list(stream)) == 3 and stream.winner == "fallback"
+assert time.perf_counter() - start < 1.0
+
+# Deadline passes before anything answers
+stream = HedgedStream(pieces(FakeChatModel(ttft=2.0, seed=1)), deadline=Deadline(0.2))
+start = time.perf_counter()
+try:
+    list(stream)
+    raise AssertionError("deadline should have passed")
+except DeadlineExceeded:
+    pass
+assert time.perf_counter() - start < 0.5
+
+# Service: slow first token goes to the fallback model, a slow reply is cut at the deadline
+usage = UsageStore(":memory:")
+service = FortuneService(StaticRefresher(), FakeChatModel(ttft=0.5, tokens_per_second=0, seed=1), "slow",
+                         cache=FortuneCache(":memory:"), metrics=Metrics(log_path=None), usage=usage, usage_source="check",
+                         fallback_model=FakeChatModel(ttft=0.05, tokens_per_second=0, reply_tokens=4, seed=2),
+                         fallback_model_name="fast", ttft_tracker=TtftTracker(default=0.1), deadline_seconds=5)
+start = time.perf_counter()
+result = service.fortune("2")
+assert result["source"] == "llm" and len(result["response"].split()) == 4, result
+assert time.perf_counter() - start < 0.5
+# Both calls are billed: the winner and the cancelled primary
+time.sleep(0.6)
+buffer = io.StringIO()
+usage.export_csv(buffer)
+calls = {(row["model"], row["source"]) for row in csv.DictReader(io.StringIO(buffer.getvalue()))}
+assert calls == {("fast", "check"), ("slow", "check:cancelled")}, calls
+# The cache key names the primary model, so the fallback's reply is not cached under it
+assert len(service.cache) == 0
+
+service = FortuneService(StaticRefresher(), FakeChatModel(ttft=0, tokens_per_second=20, reply_tokens=200, seed=1),
+                         "slow", metrics=Metrics(log_path=None), deadline_seconds=0.5)
+start = time.perf_counter()
+result = service.fortune("2")
+assert result["source"] == "partial" and result["response"].endswith("…"), result
+assert time.perf_counter() - start < 1.0
+
+service = FortuneService(StaticRefresher(), FakeChatModel(ttft=3.0, seed=1), "slow",
+                         metrics=Metrics(log_path=None), deadline_seconds=0.3)
+result = service.fortune("2")
+assert result["source"] == "fallback_generic" and "Takeuchi Takanori" in result["response"], result
+
+print("✓ hedging checks passed")
@@ -0,0 +1,143 @@
+"""
+Offline check of retries, backoff and the circuit breaker against the fault-injecting fake LLM.
+Run from the repo root: python test_modules/resilience_check.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fake_llm import FakeChatModel, FakeLLMError, StaticRefresher
+from fortune_cache import FortuneCache
+from fortune_service import FortuneService
+from fortune_store import FortuneStore
+from metrics import Metrics
+from resilience import (CircuitBreaker, CircuitOpenError, ResilientLLM, backoff_delay, is_retryable,
+                        retry_after)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def fake_model(faults, **kwargs):
+    return FakeChatModel(ttft=0, tokens_per_second=0, reply_tokens=5, seed=1, faults=faults, **kwargs)
+
+
+# Classification and Retry-After parsing
+assert is_retryable(FakeLLMError("x", 429)) and is_retryable(FakeLLMError("x", 503))
+assert not is_retryable(FakeLLMError("x", 400))
+assert is_retryable(RuntimeError("Error calling model: 429 RESOURCE_EXHAUSTED"))
+assert retry_after(FakeLLMError("x", 429, retry_after=7)) == 7
+assert retry_after(RuntimeError("429 ... 'retryDelay': '12s'")) == 12
+assert backoff_delay(10, base=0.5, cap=8) <= 8
+assert backoff_delay(0, hint=5) >= 5
+
+# Transient 429/503 are retried with backoff, Retry-After is honoured
+clock = FakeClock()
+clock.sleeps = []
+model = fake_model([429, (503, 4.0), None])
+llm = ResilientLLM(model, retries=3, sleep=clock.sleep, breaker=CircuitBreaker(5, 30, clock))
+assert "".join(chunk.content for chunk in llm.stream([])).strip()
+assert model.calls == 3 and len(clock.sleeps) == 2 and clock.sleeps[1] >= 4.0, clock.sleeps
+assert llm.invoke([]).content
+
+# Non-retryable errors are raised at once and don't trip the breaker
+model = fake_model([400])
+llm = ResilientLLM(model, retries=3, sleep=clock.sleep, breaker=CircuitBreaker(1, 30, clock))
+try:
+    llm.invoke([])
+    raise AssertionError("400 should not be retried")
+except FakeLLMError:
+    pass
+assert model.calls == 1 and llm.breaker.state == "closed"
+
+# Breaker opens after repeated failures, fails fast, then half-opens and closes on success
+breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+model = fake_model([503] * 4 + [None])
+llm = ResilientLLM(model, retries=1, sleep=clock.sleep, breaker=breaker)
+for _ in range(2):
+    try:
+        llm.invoke([])
+    except (FakeLLMError, CircuitOpenError):
+        pass
+assert breaker.state == "open", breaker.state
+calls = model.calls
+try:
+    llm.invoke([])
+    raise AssertionError("breaker should be open")
+except CircuitOpenError:
+    pass
+assert model.calls == calls  # no call went out
+clock.now += 31
+assert breaker.state == "half_open"
+try:
+    llm.invoke([])  # trial call fails -> open again
+except (FakeLLMError, CircuitOpenError):
+    pass
+assert breaker.state == "open"
+clock.now += 31
+assert llm.invoke([]).content and breaker.state == "closed"
+
+# A half-open trial without an outcome gives the trial back instead of blocking the model for good
+breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+breaker.record_failure()
+clock.now += 31
+llm = ResilientLLM(fake_model([]), sleep=clock.sleep, breaker=breaker)
+stream = llm.stream([])
+next(stream)
+stream.close()  # trial stream cancelled, e.g. it lost a hedged race
+assert breaker.state == "half_open" and breaker.allow()
+breaker.release("trial")
+llm = ResilientLLM(fake_model([400]), sleep=clock.sleep, breaker=breaker)
+try:
+    llm.invoke([])  # trial fails with a bad request: not the model's fault
+except FakeLLMError:
+    pass
+assert breaker.state == "half_open" and breaker.allow()
+breaker.release("trial")
+assert ResilientLLM(fake_model([]), breaker=breaker).invoke([]).content and breaker.state == "closed"
+
+# The fortune service falls back instead of surfacing the error
+store = FortuneStore(":memory:")
+store.put("1", "3", "old-row-hash", "old-prompt", "gemini", "Câu bói năm ngoái")
+open_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=300)
+open_breaker.record_failure()
+service = FortuneService(StaticRefresher(), ResilientLLM(fake_model([]), breaker=open_breaker), "fake",
+                         store=store, cache=FortuneCache(":memory:"), metrics=Metrics(log_path=None))
+start = time.perf_counter()
+result = service.fortune("1")
+assert result["source"] == "fallback_store" and result["response"] == "Câu bói năm ngoái", result
+result = service.fortune("2")
+assert result["source"] == "fallback_generic" and "Takeuchi Takanori" in result["response"], result
+assert time.perf_counter() - start < 1.0  # fast, no waiting on the model
+
+# Failure mid-stream also ends in a fallback
+service = FortuneService(StaticRefresher(), ResilientLLM(FakeChatModel(ttft=0, tokens_per_second=0, reply_tokens=50,
+                                                                       error_rate=1.0, seed=4), retries=0),
+                         "fake", metrics=Metrics(log_path=None))
+events = list(service.stream("2"))
+assert [event for event, _ in events].count("delta") == 7  # seed 4 fails after 7 tokens
+assert events[-1][0] == "done" and events[-1][1]["source"] == "fallback_generic", events[-1]
+
+# An empty reply (safety block, tokens spent on thinking) is a failure: fallback now, not cached for later
+cache = FortuneCache(":memory:")
+service = FortuneService(StaticRefresher(), FakeChatModel(ttft=0, tokens_per_second=0, reply_tokens=0), "fake",
+                         cache=cache, metrics=Metrics(log_path=None))
+result = service.fortune("1", "3")
+assert result["source"] == "fallback_generic" and result["response"].strip(), result
+service.model = fake_model([])
+result = service.fortune("1", "3")
+assert result["source"] == "llm" and result["response"].strip(), result
+assert service.fortune("1", "3") == result | {"source": "cache"}
+
+print("✓ resilience checks passed")
@@ -0,0 +1,176 @@
+"""
+Offline check of the Gemini ticket queue: ordering, ETA, the adaptive limit and
+the token bucket, then queued events from the service against the fake LLM.
+Run from the repo root: python test_modules/scheduler_check.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fake_llm import FakeChatModel, StaticRefresher, numbered_guests
+from fortune_service import FortuneService
+from hedging import Deadline
+from metrics import Metrics
+from resilience import ResilientLLM
+from scheduler import FortuneScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# One slot: the first ticket runs, then VIPs go before earlier regular guests, FIFO within a class
+clock = FakeClock()
+scheduler = FortuneScheduler(max_concurrency=1, default_service_seconds=5.0, clock=clock)
+first = scheduler.submit()
+assert first.wait(0)
+regular1, regular2, vip = scheduler.submit(), scheduler.submit(), scheduler.submit(priority=1)
+assert [t.info()["position"] for t in (vip, regular1, regular2)] == [1, 2, 3]
+# ETA: the running generation plus one per guest ahead, 5 s each until measured
+assert vip.info()["eta_seconds"] == 5.0 and regular2.info()["eta_seconds"] == 15.0, regular2.info()
+
+clock.now = 3.0
+first.release()
+assert vip.state == "running" and not regular1.wait(0)
+clock.now = 4.0
+vip.release()
+assert regular1.state == "running"
+assert scheduler.service_seconds() == 2.0  # median of 3 s and 1 s
+
+# A guest leaving the queue gives up their place
+regular2.release()
+assert regular2.state == "cancelled" and scheduler.status()["waiting"] == 0
+regular1.release()
+
+# 429: the limit halves once per burst and grows back by one per `limit` successes
+scheduler = FortuneScheduler(max_concurrency=8, clock=clock)
+scheduler.throttle()
+scheduler.throttle()
+assert scheduler.status()["limit"] == 4 and scheduler.throttled == 2
+for _ in range(4):
+    ticket = scheduler.submit()
+    assert ticket.wait(0)
+    ticket.release(ok=True)
+assert scheduler.status()["limit"] == 4 and scheduler.limit > 4.9
+# Failed calls (429s, errors, deadlines) give the slot back without growing the limit
+scheduler.throttle()
+clock.now += 10.0
+scheduler.throttle()
+limit = scheduler.limit
+for _ in range(10):
+    ticket = scheduler.submit()
+    assert ticket.wait(0)
+    ticket.release()
+assert scheduler.limit == limit and scheduler.status()["running"] == 0
+
+# Token bucket: 60 calls/minute admits one per second
+scheduler = FortuneScheduler(max_concurrency=8, rate_per_minute=60, clock=clock)
+a, b = scheduler.submit(), scheduler.submit()
+assert a.state == "running" and not b.wait(0)
+assert b.info()["eta_seconds"] == 1.0, b.info()
+clock.now += 1.0
+assert b.wait(0)
+
+# Real threads: never more than max_concurrency generations at once
+scheduler = FortuneScheduler(max_concurrency=3)
+running, peak, lock = [0], [0], threading.Lock()
+
+
+def guest():
+    with scheduler.submit() as ticket:
+        assert ticket.wait(5)
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+
+threads = [threading.Thread(target=guest) for _ in range(20)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert peak[0] == 3, peak
+
+# Service: the second guest waits for the slot and sees a ticket first
+service = FortuneService(StaticRefresher(numbered_guests(2)),
+                         FakeChatModel(ttft=1.5, tokens_per_second=0, reply_tokens=3, seed=1), "fake",
+                         metrics=Metrics(log_path=None), scheduler=FortuneScheduler(max_concurrency=1))
+events = {}
+
+
+def ask(guest_id, deadline=None):
+    events[guest_id] = list(service.stream(guest_id, deadline=deadline))
+
+
+leader = threading.Thread(target=ask, args=(1,))
+leader.start()
+time.sleep(0.2)
+ask(2)
+leader.join()
+queued = [payload for event, payload in events[2] if event == "queued"]
+assert queued and queued[0]["position"] == 1 and queued[0]["ticket"] == 2, events[2]
+assert events[1][-1][1]["source"] == "llm" and events[2][-1][1]["source"] == "llm"
+assert service.queue()["running"] == 0 and service.queue()["waiting"] == 0
+
+# Everyone leaves mid-generation: the call is stopped and forgotten, the next request starts afresh
+service = FortuneService(StaticRefresher(numbered_guests(2)),
+                         FakeChatModel(ttft=0, tokens_per_second=20, reply_tokens=50, seed=1), "fake",
+                         metrics=Metrics(log_path=None), scheduler=FortuneScheduler(max_concurrency=1))
+stream = service.stream(1)
+while next(stream)[0] != "delta":
+    pass
+assert len(service.flights) == 1
+stream.close()
+assert len(service.flights) == 0 and service.queue()["running"] == 0
+assert service.fortune(1)["source"] == "llm"
+
+# Only the request that opens a generation takes a ticket; one joining it while it is
+# still queued shares that ticket and never calls the model before it is admitted
+model = FakeChatModel(ttft=0, tokens_per_second=0, reply_tokens=3, seed=1)
+service = FortuneService(StaticRefresher(numbered_guests(2)), model, "fake",
+                         metrics=Metrics(log_path=None), scheduler=FortuneScheduler(max_concurrency=1))
+busy = service.scheduler.submit()
+leader = threading.Thread(target=ask, args=(1,))
+leader.start()
+time.sleep(0.1)
+follower = threading.Thread(target=lambda: events.update(follower=list(service.stream(1))))
+follower.start()
+time.sleep(0.3)
+assert model.calls == 0 and service.queue()["waiting"] == 1
+busy.release()
+leader.join()
+follower.join()
+assert model.calls == 1 and events[1][-1][1]["source"] == "llm"
+assert events["follower"][-1][1]["source"] == "coalesced" and "queued" not in dict(events["follower"])
+assert service.queue()["running"] == 0
+
+# Deadline passes in the queue: fallback fortune, the ticket is given back
+service = FortuneService(StaticRefresher(numbered_guests(2)),
+                         FakeChatModel(ttft=1.0, tokens_per_second=0, reply_tokens=3, seed=1), "fake",
+                         metrics=Metrics(log_path=None), scheduler=FortuneScheduler(max_concurrency=1))
+leader = threading.Thread(target=ask, args=(1,))
+leader.start()
+time.sleep(0.1)
+ask(2, Deadline(0.3))
+leader.join()
+assert events[2][-1][1]["source"] == "fallback_generic" and events[1][-1][1]["source"] == "llm", events
+assert service.queue()["waiting"] == 0
+
+# ResilientLLM reports 429s to the scheduler
+scheduler = FortuneScheduler(max_concurrency=4)
+model = ResilientLLM(FakeChatModel(ttft=0, tokens_per_second=0, reply_tokens=1, faults=[429]), retries=1,
+                     sleep=lambda seconds: None, on_rate_limited=scheduler.throttle)
+model.invoke([])
+assert scheduler.throttled == 1 and scheduler.status()["limit"] == 2
+
+print("✓ scheduler checks passed")
@@ -0,0 +1,60 @@
+"""
+Offline check of speculative generation: claim a matching speculation, skip
+unknown IDs and a busy queue, cancel a queued one, cache one that is never claimed.
+Run from the repo root: python test_modules/speculation_check.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fake_llm import FakeChatModel, StaticRefresher, numbered_guests
+from fortune_cache import FortuneCache
+from fortune_client import LocalFortuneClient
+from fortune_service import FortuneService
+from metrics import Metrics
+from scheduler import FortuneScheduler
+from speculation import Speculation
+
+model = FakeChatModel(ttft=0.3, tokens_per_second=0, reply_tokens=3, seed=1)
+service = FortuneService(StaticRefresher(numbered_guests(3)), model, "fake", cache=FortuneCache(":memory:"),
+                         metrics=Metrics(log_path=None), scheduler=FortuneScheduler(max_concurrency=1))
+client = LocalFortuneClient(service)
+
+# Typed ID + number match: submit replays the buffered events and follows the rest live
+speculation = Speculation(client, " 1", "7").start()
+time.sleep(0.1)
+assert speculation.matches("1", "7 ") and not speculation.matches("1", "8")
+events = list(speculation.claim())
+assert events[0][0] == "participant" and events[-1][1]["source"] == "llm", events
+assert model.calls == 1
+
+# Unknown ID: nothing generated, the submit falls back to a normal request
+assert Speculation(client, "999").start().claim() is None and model.calls == 1
+
+# Never claimed: once the model is answering it runs to the end and lands in the cache
+speculation = Speculation(client, "2").start()
+time.sleep(0.35)
+speculation.cancel()
+while not speculation.done:
+    time.sleep(0.01)
+assert service.fortune("2")["source"] == "cache" and model.calls == 2
+
+# Busy queue: a real request holds the only slot and another one waits, so nothing is speculated
+busy = service.scheduler.submit()
+waiting = service.scheduler.submit()
+assert Speculation(client, "3").start().claim() is None
+waiting.release()
+
+# Queued speculation that is cancelled gives its ticket back before calling the model
+speculation = Speculation(client, "3").start()
+time.sleep(0.1)
+assert [event for event, _ in speculation.events][-1] == "queued", speculation.events
+speculation.cancel()
+time.sleep(1.1)
+assert speculation.done and speculation.skipped == "cancelled"
+busy.release()
+assert service.queue()["waiting"] == 0 and service.queue()["running"] == 0 and model.calls == 2
+
+print("✓ speculation checks passed")
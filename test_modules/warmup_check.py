@@ -0,0 +1,81 @@
+"""
+Offline check of the startup warm-up and the readiness status.
+Run from the repo root: python test_modules/warmup_check.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fake_llm import FakeChatModel, StaticRefresher
+from fortune_service import FortuneService
+from llm import AsyncLLM, LazyModel
+from metrics import Metrics
+from resilience import ResilientLLM
+from usage_store import UsageStore
+
+class SlowRefresher:
+    """First snapshot only after loaded is set, like a SharePoint download"""
+
+    def __init__(self):
+        self.loaded = threading.Event()
+        self.workbook = StaticRefresher()
+
+    def current(self, timeout=60):
+        if not self.loaded.wait(timeout):
+            raise TimeoutError("Workbook is not loaded yet")
+        return self.workbook.current()
+
+
+built = []
+
+
+def build_model():
+    built.append(time.time())
+    return FakeChatModel(ttft=0.05, tokens_per_second=0, reply_tokens=1, seed=1)
+
+
+refresher = SlowRefresher()
+usage = UsageStore(":memory:")
+service = FortuneService(refresher, ResilientLLM(AsyncLLM(LazyModel(build_model))), "fake",
+                         usage=usage, metrics=Metrics(log_path=None))
+assert not built  # nothing built before the warm-up runs
+
+service.warmup.start(service, workbook_timeout=0.1)
+time.sleep(0.3)
+status = service.ready()
+assert not status["ready"] and status["stages"]["workbook"]["state"] == "running", status
+
+refresher.loaded.set()
+assert service.warmup.wait(5)
+status = service.ready()
+assert status["ready"] and not status["degraded"], status
+assert [stage["state"] for stage in status["stages"].values()] == ["done"] * 4, status
+assert status["models"] == {"primary": {"model": "fake", "state": "ready", "seconds": status["models"]["primary"]["seconds"]}}
+assert len(built) == 1 and len(usage) == 1  # model built once, priming call recorded
+
+# Priming failure: still ready (fallback fortunes), reported as degraded
+broken = FortuneService(refresher, ResilientLLM(AsyncLLM(LazyModel(lambda: FakeChatModel(faults=[400]))), retries=0),
+                        "fake", metrics=Metrics(log_path=None))
+broken.warmup.start(broken)
+assert broken.warmup.wait(5)
+status = broken.ready()
+assert status["ready"] and status["degraded"] and status["stages"]["priming"]["state"] == "failed", status
+
+assert broken.ready()["models"]["primary"]["state"] == "failed"
+
+# Primary down: the fallback model is still built and primed on its own
+usage = UsageStore(":memory:")
+both = FortuneService(refresher, ResilientLLM(AsyncLLM(LazyModel(lambda: FakeChatModel(faults=[400]))), retries=0),
+                      "primary", usage=usage, metrics=Metrics(log_path=None),
+                      fallback_model=ResilientLLM(AsyncLLM(LazyModel(build_model))), fallback_model_name="backup")
+both.warmup.start(both)
+assert both.warmup.wait(5)
+status = both.ready()
+assert status["ready"] and status["degraded"], status
+assert status["models"]["primary"]["state"] == "failed" and status["models"]["fallback"]["state"] == "ready", status
+assert status["models"]["fallback"]["model"] == "backup" and len(usage) == 1
+
+print("✓ warm-up checks passed")